@@ -0,0 +1,60 @@
+# /activity_log_utils.py
+import json
+import random
+from datetime import datetime
+from model import UserActivity, get_current_ist
+from api_utils import enrich_user_activity
+from setup_redis import redis_store
+from buffer_utils import drain_buffer
+
+ACTIVITY_BUFFER_KEY = "user_activity:buffer"
+ACTIVITY_DROPPED_KEY = "user_activity:dropped"
+ACTIVITY_FLUSH_BATCH_SIZE = 500
+ACTIVITY_SAMPLE_THRESHOLD = 20000  # past this backlog only a sample of activities is kept
+ACTIVITY_SAMPLE_RATE = 0.1
+ACTIVITY_BUFFER_LIMIT = 100000  # past this backlog activities are dropped
+
+
+def log_user_activity(activity):
+    """Buffer a captured activity (user_id, user_role, activity_type, client_ip, user_agent) for bulk insertion.
+
+    Returns True if the activity was buffered. The activity is stamped with the current IST time, which
+    becomes its record_creation_timestamp however late it is flushed. When the flusher falls behind,
+    activities are sampled and then dropped (and counted) rather than letting the buffer grow without bound.
+    """
+    backlog = redis_store.llen(ACTIVITY_BUFFER_KEY)
+    if backlog >= ACTIVITY_BUFFER_LIMIT or (
+        backlog >= ACTIVITY_SAMPLE_THRESHOLD and random.random() >= ACTIVITY_SAMPLE_RATE
+    ):
+        redis_store.incr(ACTIVITY_DROPPED_KEY)
+        return False
+
+    activity = dict(activity, timestamp=get_current_ist().replace(tzinfo=None).isoformat())
+    backlog = redis_store.rpush(ACTIVITY_BUFFER_KEY, json.dumps(activity))
+    if backlog % ACTIVITY_FLUSH_BATCH_SIZE == 0:
+        # A full batch is waiting: flush now instead of at the next periodic run
+        from celery_tasks import flush_user_activity_logs
+        flush_user_activity_logs.delay()
+    return True
+
+
+def _activity_row(activity):
+    """Enrich a buffered activity into UserActivity columns, timestamped when it was queued (not when flushed)."""
+    row = enrich_user_activity(activity)
+    queued_at = activity.get("timestamp")
+    row["record_creation_timestamp"] = datetime.fromisoformat(queued_at) if queued_at else get_current_ist().replace(tzinfo=None)
+    return row
+
+
+def _decode_activity(raw_activity):
+    return _activity_row(json.loads(raw_activity))
+
+
+def flush_user_activity_buffer(batch_size=ACTIVITY_FLUSH_BATCH_SIZE):
+    """Enrich up to `batch_size` buffered activities and move them into user_activities with one bulk insert."""
+    return drain_buffer(ACTIVITY_BUFFER_KEY, UserActivity, _decode_activity, batch_size)
+
+
+def pop_dropped_activity_count():
+    """Return and reset the number of activities dropped by backpressure since the last call."""
+    return int(redis_store.getset(ACTIVITY_DROPPED_KEY, 0) or 0)
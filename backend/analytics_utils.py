@@ -0,0 +1,121 @@
+# /analytics_utils.py
+from datetime import timedelta
+from sqlalchemy import and_, func, case, delete, insert, update
+from sqlalchemy.orm import aliased
+from model import db, QuizAttempt, QuizEventLog, QuestionDwellTime
+
+DWELL_TIME_BATCH_SIZE = 200
+DWELL_TIME_SETTLE = timedelta(minutes=5)  # let the event buffer flush before an attempt is analysed
+ADVANCING_EVENT_TYPES = ('SAVE_RESPONSE', 'MARK_FOR_REVIEW')  # "Save & Next" and "Mark for Review" move on
+
+
+def _seconds_between(start, end):
+    """Dialect-aware number of seconds from `start` to `end`."""
+    if db.engine.dialect.name == 'postgresql':
+        return func.extract('epoch', end - start)
+    return (func.julianday(end) - func.julianday(start)) * 86400.0
+
+
+def dwell_time_rows(quiz_attempt_ids):
+    """Compute (attempt, question) dwell times for finished attempts in one windowed pass over quiz_event_logs.
+
+    The time from an event to the next one is spent on the question on screen after that event:
+    - a navigation (or a clear/delete/unmark) leaves the candidate on its own question;
+    - SAVE_RESPONSE and MARK_FOR_REVIEW advance to the next question, which is the question of the
+      next event that has one;
+    - events without a question (START_EXAM, TAB_SWITCH_WARNING) keep whatever was on screen, or the
+      first question reached when nothing was on screen yet.
+    Visits count the navigations onto a question.
+    """
+    window = {'partition_by': QuizEventLog.quiz_attempt_id, 'order_by': (QuizEventLog.event_timestamp, QuizEventLog.id)}
+    events = (
+        db.session.query(
+            QuizEventLog.quiz_attempt_id.label('quiz_attempt_id'),
+            QuizEventLog.question_id.label('question_id'),
+            QuizEventLog.event_type.label('event_type'),
+            QuizEventLog.event_timestamp.label('event_timestamp'),
+            func.lead(QuizEventLog.event_timestamp).over(**window).label('next_timestamp'),
+            # Events with a question seen so far: an event and the question-less events after it share a number
+            func.count(QuizEventLog.question_id).over(**window, rows=(None, 0)).label('question_seq')
+        )
+        .filter(QuizEventLog.quiz_attempt_id.in_(quiz_attempt_ids))
+        .subquery()
+    )
+    question_events = (
+        db.session.query(
+            events.c.quiz_attempt_id, events.c.question_seq, events.c.question_id,
+            events.c.event_type.in_(ADVANCING_EVENT_TYPES).label('advances')
+        )
+        .filter(events.c.question_id.isnot(None))
+        .subquery()
+    )
+    current, upcoming = aliased(question_events), aliased(question_events)
+
+    question_id = case(
+        (and_(current.c.question_id.isnot(None), current.c.advances.is_(False)), current.c.question_id),
+        else_=upcoming.c.question_id
+    )
+    seconds = _seconds_between(events.c.event_timestamp, events.c.next_timestamp)
+    rows = (
+        db.session.query(
+            events.c.quiz_attempt_id,
+            question_id.label('question_id'),
+            func.sum(case((seconds > 0, seconds), else_=0)).label('dwell_seconds'),
+            func.sum(case((events.c.event_type == 'QUESTION_NUMBER_CLICK', 1), else_=0)).label('visits')
+        )
+        .outerjoin(current, and_(
+            current.c.quiz_attempt_id == events.c.quiz_attempt_id,
+            current.c.question_seq == events.c.question_seq
+        ))
+        .outerjoin(upcoming, and_(
+            upcoming.c.quiz_attempt_id == events.c.quiz_attempt_id,
+            upcoming.c.question_seq == events.c.question_seq + 1
+        ))
+        .filter(events.c.next_timestamp.isnot(None), question_id.isnot(None))
+        .group_by(events.c.quiz_attempt_id, question_id)
+        .all()
+    )
+    return [
+        {
+            'quiz_attempt_id': row.quiz_attempt_id,
+            'question_id': row.question_id,
+            'dwell_seconds': round(float(row.dwell_seconds or 0), 3),
+            'visits': int(row.visits or 0)
+        } for row in rows
+    ]
+
+
+def compute_question_dwell_times(now_naive, batch_size=DWELL_TIME_BATCH_SIZE):
+    """Store dwell times for the next batch of finished, unprocessed attempts; returns the number of attempts processed."""
+    attempts = (
+        db.session.query(QuizAttempt.id, QuizAttempt.quiz_id)
+        .filter(
+            QuizAttempt.analytics_processed.is_(False),
+            QuizAttempt.quiz_end_time.isnot(None),
+            QuizAttempt.quiz_end_time <= now_naive - DWELL_TIME_SETTLE
+        )
+        .order_by(QuizAttempt.quiz_end_time)
+        .limit(batch_size)
+        .all()
+    )
+    if not attempts:
+        return 0
+
+    quiz_ids = dict(attempts)
+    attempt_ids = list(quiz_ids)
+    rows = dwell_time_rows(attempt_ids)
+    for row in rows:
+        row['quiz_id'] = quiz_ids[row['quiz_attempt_id']]
+
+    # Re-running a batch replaces its rows instead of doubling them
+    db.session.execute(delete(QuestionDwellTime).where(QuestionDwellTime.quiz_attempt_id.in_(attempt_ids)))
+    if rows:
+        db.session.execute(insert(QuestionDwellTime), rows)
+    db.session.execute(
+        update(QuizAttempt)
+        .where(QuizAttempt.id.in_(attempt_ids))
+        .values(analytics_processed=True)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return len(attempt_ids)
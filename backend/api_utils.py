@@ -1,16 +1,19 @@
-import socket
 import os
 import psutil
 import platform
 import subprocess
 from flask import jsonify
-from functools import wraps
+from functools import wraps, lru_cache
 from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity, get_jwt
 from user_agents import parse  # Make sure to install: pip install pyyaml ua-parser user-agents
 from model import User, Admin
+from collections import namedtuple
 from datetime import datetime
 import pytz
 
+# What most routes need to know about the caller, without loading the ORM row
+Principal = namedtuple('Principal', ['id', 'email', 'role', 'username'])
+
 def get_current_ist():
     """Returns the current datetime in Asia/Kolkata timezone."""
     return datetime.now(pytz.timezone("Asia/Kolkata"))
@@ -22,20 +25,20 @@ def admin_required():
         def decorator(*args, **kwargs):
             verify_jwt_in_request()
             claims = get_jwt()
-            if claims['role'] != 'admin':
+            if claims.get('role') != 'admin':
                 return jsonify(msg="Admins only!"), 403
             return fn(*args, **kwargs)
         return decorator
     return wrapper
 
-def user_required():
+def user_required(locations=None):
     def wrapper(fn):
         from functools import wraps
         @wraps(fn)
         def decorator(*args, **kwargs):
-            verify_jwt_in_request()
+            verify_jwt_in_request(locations=locations)
             claims = get_jwt()
-            if claims['role'] != 'user':
+            if claims.get('role') != 'user':
                 return jsonify(msg="User only!"), 403
             return fn(*args, **kwargs)
         return decorator
@@ -51,6 +54,26 @@ def get_current_user():
     admin = Admin.query.filter_by(email=identity).first()
     return admin 
 
+def _load_principal(role, email):
+    """Look the account up in the table of its role (both tables for tokens without a role claim)."""
+    models = {'user': (User,), 'admin': (Admin,)}.get(role, (User, Admin))
+    for model in models:
+        account = model.query.with_entities(model.id, model.username).filter_by(email=email).first()
+        if account:
+            return Principal(account.id, email, 'admin' if model is Admin else 'user', account.username)
+    return None
+
+def get_current_principal():
+    """Return the caller as a Principal(id, email, role, username), built from the JWT claims set at login.
+
+    Only tokens issued without the id/role claims cost a database lookup (None if the account no longer exists).
+    """
+    email = get_jwt_identity()
+    claims = get_jwt()
+    if claims.get('id') is not None and claims.get('role') in ('user', 'admin'):
+        return Principal(claims['id'], email, claims['role'], claims.get('username'))
+    return _load_principal(claims.get('role'), email)
+
 def get_mac_from_ip(ip: str):
     try:
         output = subprocess.check_output(f"arp -a {ip}", shell=True).decode('utf-8')
@@ -71,44 +94,52 @@ def get_mac_address():
                 mac_addresses.append(addr.address)
     return mac_addresses
 
-def get_system_info(request):
-    try:
-        # Get client IP address
-        client_ip = socket.gethostbyname(socket.gethostname())
+def capture_client_info(request):
+    """Capture only what the request itself knows about the client (IP and raw User-Agent); enrichment happens off-request.
 
-        # Retrieve MAC addresses for all network interfaces
-        mac_addresses = get_mac_address()
+    The IP is request.remote_addr: behind trusted proxies ProxyFix (PROXY_FIX_X_FOR) resolves it from X-Forwarded-For.
+    """
+    return {
+        "client_ip": request.remote_addr or "Unknown",
+        "user_agent": request.headers.get("user-agent", "Unknown")
+    }
 
-        # Get OS info and user-agent info
-        os_info = f"{platform.system()} {platform.version()}"
-        user_agent_str = request.headers.get("user-agent", "Unknown")
+@lru_cache(maxsize=1024)
+def parse_user_agent(user_agent_str):
+    """Return (browser, device) for a User-Agent string; each distinct agent is parsed once per process."""
+    try:
         user_agent = parse(user_agent_str)
         browser = f"{user_agent.browser.family} {user_agent.browser.version_string}" if user_agent.browser.family else "Unknown"
         device = f"{user_agent.device.family} ({user_agent.os.family} {user_agent.os.version_string})"
+        return browser, device
+    except Exception as e:
+        print(f"Error parsing user agent: {e}")
+        return "Unknown", "Unknown"
 
-        # System memory and CPU info
-        memory_gb = round(psutil.virtual_memory().total / (1024 ** 3), 2)  # Memory in GB
-        cpu_cores = os.cpu_count()  # Number of CPU cores
-
+@lru_cache(maxsize=1)
+def get_host_info():
+    """Introspect the host once per process: its MAC addresses, OS, memory and CPU cores do not change while it runs."""
+    try:
         return {
-            "client_ip": client_ip,
-            "mac_addresses": mac_addresses,
-            "os_info": os_info,
-            "browser": browser,
-            "device": device,
-            "user_agent": user_agent_str,
-            "memory_gb": memory_gb,
-            "cpu_cores": cpu_cores,
+            "mac_address": ",".join(get_mac_address()),
+            "os_info": f"{platform.system()} {platform.version()}",
+            "memory_gb": round(psutil.virtual_memory().total / (1024 ** 3), 2),  # Memory in GB
+            "cpu_cores": os.cpu_count()
         }
     except Exception as e:
-        print(f"Error getting system info: {e}")
-        return {
-            "client_ip": "Unknown",
-            "mac_addresses": [],
-            "os_info": "Unknown",
-            "browser": "Unknown",
-            "device": "Unknown",
-            "user_agent": "Unknown",
-            "memory_gb": 0,
-            "cpu_cores": 0,
-        }
+        print(f"Error getting host info: {e}")
+        return {"mac_address": "", "os_info": "Unknown", "memory_gb": 0, "cpu_cores": 0}
+
+def enrich_user_activity(activity):
+    """Turn a captured activity (user_id, user_role, activity_type, client_ip, user_agent) into UserActivity columns."""
+    browser, device = parse_user_agent(activity.get("user_agent") or "Unknown")
+    return dict(
+        get_host_info(),
+        user_id=activity["user_id"],
+        user_role=activity["user_role"],
+        activity_type=activity["activity_type"],
+        client_ip=activity.get("client_ip") or "Unknown",
+        user_agent=activity.get("user_agent") or "Unknown",
+        browser=browser,
+        device=device
+    )
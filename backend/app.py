@@ -3,9 +3,12 @@ from flask import Flask
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from flask_mail import Mail  
+from werkzeug.middleware.proxy_fix import ProxyFix
 from setup_cache import cache
+from setup_redis import redis_store
 from config import get_config
 from model import db
+from token_revocation_utils import is_token_revoked
 from routes.admin_authentication import admin_auth_bp
 from routes.admin_dashboard import admin_dashboard_bp
 from routes.admin_subject import admin_subject_bp
@@ -13,6 +16,7 @@ from routes.admin_chapter import admin_chapter_bp
 from routes.admin_quiz import admin_quiz_bp
 from routes.admin_question import admin_question_bp
 from routes.admin_summary import admin_summary_bp
+from routes.admin_exam_monitor import admin_exam_monitor_bp
 
 from routes.user_dashboard import user_dashboard_bp
 from routes.user_authentication import user_auth_bp
@@ -31,10 +35,21 @@ def create_app():
     app.config.from_object(config_class)
     CORS(app, resources={r"/*": {"origins": "http://localhost:5173"}})
 
+    # request.remote_addr is the real client only through a known number of trusted proxies
+    if app.config["PROXY_FIX_X_FOR"]:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config["PROXY_FIX_X_FOR"])
+
     # Initialize extensions
     db.init_app(app)
     jwt = JWTManager(app)
+
+    # Revoked tokens (logout) are rejected; the common case is answered from an in-process Bloom filter
+    @jwt.token_in_blocklist_loader
+    def check_if_token_revoked(jwt_header, jwt_payload):
+        return is_token_revoked(jwt_payload)
+
     cache.init_app(app)
+    redis_store.init_app(app)
     mail.init_app(app)
 
     # Register Blueprints
@@ -45,6 +60,7 @@ def create_app():
     app.register_blueprint(admin_quiz_bp, url_prefix='/api')
     app.register_blueprint(admin_question_bp, url_prefix='/api')
     app.register_blueprint(admin_summary_bp, url_prefix='/api')
+    app.register_blueprint(admin_exam_monitor_bp, url_prefix='/api')
 
     app.register_blueprint(user_auth_bp, url_prefix='/api')
     app.register_blueprint(user_dashboard_bp, url_prefix='/api')
@@ -0,0 +1,134 @@
+# /benchmark_grading.py
+# Measures the grading hot paths (latency and query count) for growing question papers: saving an
+# answer, which updates the attempt's live counters, and finalizing an attempt, which regrades nothing.
+# Runs against a throwaway in-memory SQLite database, no .env needed:
+#   python benchmark_grading.py --sizes 10 50 100 250 500 --repeats 5
+import argparse
+import time
+from datetime import timedelta
+from flask import Flask
+from sqlalchemy import event
+from model import db, Admin, Subject, Chapter, Quiz, Question, User, QuizAttempt, get_current_ist
+from grading_utils import finalize_quiz_attempt, lock_open_attempt, apply_attempt_counters
+from routes.user_exam_interface import stage_save_response
+from collections import Counter
+
+
+def create_benchmark_app():
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db.init_app(app)
+    return app
+
+
+def seed_quiz(question_count):
+    """Create a quiz with `question_count` questions; returns its id and answer key."""
+    admin = Admin.query.first()
+    chapter = Chapter.query.first()
+    quiz = Quiz(chapter_id=chapter.id, admin_id=admin.id, date_of_quiz=get_current_ist().date(), time_duration=60)
+    db.session.add(quiz)
+    db.session.flush()
+
+    questions = [
+        Question(
+            quiz_id=quiz.id,
+            admin_id=admin.id,
+            question_statement=f"Question {i}",
+            option1="A", option2="B", option3="C", option4="D",
+            correct_option="option1",
+            difficulty=("easy", "medium", "hard")[i % 3]
+        ) for i in range(question_count)
+    ]
+    db.session.add_all(questions)
+    db.session.commit()
+    answer_key = {q.id: (q.correct_option, q.score_value, [q.option1, q.option2, q.option3, q.option4]) for q in questions}
+    return quiz.id, answer_key
+
+
+def start_attempt(quiz_id, answer_key):
+    """Create an open attempt with no saved answers."""
+    quiz_attempt = QuizAttempt(
+        user_id=User.query.first().id,
+        quiz_id=quiz_id,
+        total_questions_count=len(answer_key),
+        total_skipped_qn=len(answer_key),
+        total_score=sum(entry[1] for entry in answer_key.values()),
+        quiz_start_time=(get_current_ist() - timedelta(minutes=30)).replace(tzinfo=None)
+    )
+    db.session.add(quiz_attempt)
+    db.session.commit()
+    return quiz_attempt.id
+
+
+def save_answer(quiz_attempt_id, user_id, question_id, selected_option, answer_key):
+    """One save request's database work: lock the attempt, upsert the answer, move the counters, commit."""
+    lock_open_attempt(quiz_attempt_id)
+    counters = Counter()
+    stage_save_response(quiz_attempt_id, user_id, question_id, selected_option, get_current_ist(), answer_key, counters)
+    apply_attempt_counters(quiz_attempt_id, counters)
+    db.session.commit()
+
+
+def run_benchmark(sizes, repeats):
+    app = create_benchmark_app()
+    with app.app_context():
+        db.create_all()
+        admin = Admin(username="bench", email="bench@example.com", password="x", full_name="Bench Admin")
+        user = User(username="candidate", email="candidate@example.com", password="x", full_name="Candidate")
+        db.session.add_all([admin, user])
+        db.session.flush()
+        subject = Subject(name="Benchmark", admin_id=admin.id)
+        db.session.add(subject)
+        db.session.flush()
+        db.session.add(Chapter(subject_id=subject.id, admin_id=admin.id, name="Benchmark"))
+        db.session.commit()
+
+        query_count = {"value": 0}
+
+        def count_queries(*args, **kwargs):
+            query_count["value"] += 1
+
+        event.listen(db.engine, "before_cursor_execute", count_queries)
+
+        print(f"{'questions':>10} {'save ms':>10} {'save max':>10} {'save q':>8} {'final ms':>10} {'final max':>10} {'final q':>8}")
+        user_id = User.query.first().id
+        for size in sizes:
+            quiz_id, answer_key = seed_quiz(size)
+
+            # Every question answered `repeats` times over, alternating right and wrong answers
+            attempt_id = start_attempt(quiz_id, answer_key)
+            save_timings = []
+            save_queries = 0
+            for repeat in range(repeats):
+                for question_id in answer_key:
+                    query_count["value"] = 0
+                    started = time.perf_counter()
+                    save_answer(attempt_id, user_id, question_id, "option1" if repeat % 2 == 0 else "option2", answer_key)
+                    save_timings.append((time.perf_counter() - started) * 1000)
+                    save_queries = query_count["value"]
+
+            finalize_timings = []
+            finalize_queries = 0
+            for _ in range(repeats):
+                attempt_id = start_attempt(quiz_id, answer_key)
+                query_count["value"] = 0
+                started = time.perf_counter()
+                finalize_quiz_attempt(attempt_id, (get_current_ist() - timedelta(minutes=30)).timestamp(), get_current_ist())
+                finalize_timings.append((time.perf_counter() - started) * 1000)
+                finalize_queries = query_count["value"]
+
+            print(
+                f"{size:>10} {sum(save_timings) / len(save_timings):>10.2f} {max(save_timings):>10.2f} {save_queries:>8}"
+                f" {sum(finalize_timings) / len(finalize_timings):>10.2f} {max(finalize_timings):>10.2f} {finalize_queries:>8}"
+            )
+
+        event.remove(db.engine, "before_cursor_execute", count_queries)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark saving answers and finalizing quiz attempts")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 100, 250, 500, 1000])
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+    run_benchmark(args.sizes, args.repeats)
@@ -0,0 +1,56 @@
+# /buffer_utils.py
+from sqlalchemy import insert
+from sqlalchemy.exc import OperationalError
+from model import db
+from setup_redis import redis_store
+
+
+def drain_buffer(key, model, decode_row, batch_size):
+    """Move up to `batch_size` raw rows buffered in the Redis list `key` into `model`'s table.
+
+    Each raw row is turned into column values by `decode_row`. Returns the number of rows inserted.
+    """
+    pipe = redis_store.pipeline()
+    pipe.lrange(key, 0, batch_size - 1)
+    pipe.ltrim(key, batch_size, -1)
+    raw_rows, _ = pipe.execute()
+    if not raw_rows:
+        return 0
+
+    rows = [decode_row(raw_row) for raw_row in raw_rows]
+    table_name = model.__tablename__
+    try:
+        db.session.execute(insert(model), rows)
+        db.session.commit()
+        return len(rows)
+    except OperationalError:
+        # Database unavailable: put the batch back at the head of the buffer in its original order
+        db.session.rollback()
+        redis_store.lpush(key, *reversed(raw_rows))
+        raise
+    except Exception as e:
+        # A bad row (e.g. a deleted attempt or user) must not poison the whole batch
+        db.session.rollback()
+        print(f"Bulk insert into {table_name} failed, retrying row by row: {e}")
+
+    inserted = 0
+    for row in rows:
+        try:
+            db.session.execute(insert(model), [row])
+            db.session.commit()
+            inserted += 1
+        except Exception as e:
+            db.session.rollback()
+            print(f"Dropping {table_name} row {row}: {e}")
+    return inserted
+
+
+def drain_buffer_batches(flush, max_batches):
+    """Call `flush` until it inserts nothing or `max_batches` calls were made; returns the rows inserted."""
+    total_inserted = 0
+    for _ in range(max_batches):
+        inserted = flush()
+        total_inserted += inserted
+        if not inserted:
+            break
+    return total_inserted
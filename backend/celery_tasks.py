@@ -14,6 +14,14 @@ import csv
 from dotenv import load_dotenv
 import os
 from api_utils import get_current_ist
+from event_log_utils import flush_quiz_event_buffer, log_quiz_events
+from activity_log_utils import flush_user_activity_buffer, pop_dropped_activity_count
+from buffer_utils import drain_buffer_batches
+from exam_session_utils import reconcile_tab_switch_counts, end_exam_sessions
+from grading_utils import backfill_attempt_deadlines, close_expired_attempts, regrade_attempt_chunk, REGRADE_CHUNK_SIZE
+from quiz_cache_utils import warm_quiz_cache
+from analytics_utils import compute_question_dwell_times
+from live_monitor_utils import record_attempts_finished, reconcile_live_attempts
 
 load_dotenv()
 # Load the API key from the .env file
@@ -79,9 +87,8 @@ def send_payment_status_email(recipient_email, quiz_ids, payment_status, transac
     mail.send(email_message)
     print(f"Payment status email sent to {recipient_email} for transaction {transaction_id}")
     
-# Send Exam Status Email
-@celery_app.task(name="send_exam_status_email")
-def send_exam_status_email(recipient_email, quiz_id, attempt_id, status, score_details):
+# Build Exam Status Email
+def build_exam_status_message(recipient_email, quiz_id, attempt_id, status, score_details):
     html_content = render_template(
         "exam_status.html",
         quiz_id=quiz_id,
@@ -92,16 +99,35 @@ def send_exam_status_email(recipient_email, quiz_id, attempt_id, status, score_d
     )
     
     # Create email message
-    email_message = Message(
+    return Message(
         subject=f"Quiz #{quiz_id} - Examination {status}",
         sender=SENDER_MAIL,
         recipients=[recipient_email],
         html=html_content
     )
+
+# Send Exam Status Email
+@celery_app.task(name="send_exam_status_email")
+def send_exam_status_email(recipient_email, quiz_id, attempt_id, status, score_details):
+    email_message = build_exam_status_message(recipient_email, quiz_id, attempt_id, status, score_details)
     
     # Send the email
     mail.send(email_message)
     print(f"Exam status email sent to {recipient_email} for quiz {quiz_id}, attempt {attempt_id}")    
+
+# Send Exam Status Emails in bulk over one SMTP connection
+@celery_app.task(name="send_exam_status_email_batch")
+def send_exam_status_email_batch(notifications):
+    sent = 0
+    with mail.connect() as connection:
+        for notification in notifications:
+            try:
+                connection.send(build_exam_status_message(**notification))
+                sent += 1
+            except Exception as e:
+                print(f"Error sending exam status email for attempt {notification['attempt_id']}: {str(e)}")
+    print(f"Exam status emails sent: {sent}/{len(notifications)}")
+    return sent
     
 # Daily Reminder for Users
 @celery_app.task(name="send_daily_reminder")
@@ -438,6 +464,116 @@ def export_all_users_quiz_data_to_csv(admin_id, admin_email):
 
     except Exception as e:
         print(f"Error in export task: {str(e)}")
+
+# Drain buffered quiz event logs into the database
+@celery_app.task(name="flush_quiz_event_logs")
+def flush_quiz_event_logs(max_batches=20):
+    total_inserted = drain_buffer_batches(flush_quiz_event_buffer, max_batches)
+    if total_inserted:
+        print(f"Flushed {total_inserted} quiz event logs")
+    return total_inserted
+
+# Drain the buffered login/logout/password activities into user_activities
+@celery_app.task(name="flush_user_activity_logs")
+def flush_user_activity_logs(max_batches=20):
+    total_inserted = drain_buffer_batches(flush_user_activity_buffer, max_batches)
+    dropped = pop_dropped_activity_count()
+    if total_inserted or dropped:
+        print(f"Flushed {total_inserted} user activities ({dropped} dropped by backpressure)")
+    return total_inserted
+
+# Close attempts whose timer ran out without the browser ending them
+@celery_app.task(name="finalize_expired_attempts")
+def finalize_expired_attempts(max_batches=20):
+    backfill_attempt_deadlines()
+    notifications = []
+    for _ in range(max_batches):
+        closed = close_expired_attempts(get_current_ist().replace(tzinfo=None))
+        if not closed:
+            break
+        end_exam_sessions([attempt['attempt_id'] for attempt in closed], 'Time expired')
+        record_attempts_finished([(attempt['quiz_id'], attempt['attempt_id']) for attempt in closed])
+        log_quiz_events([{
+            'user_id': attempt['user_id'],
+            'quiz_attempt_id': attempt['attempt_id'],
+            'event_type': 'END_EXAMINATION',
+            'event_timestamp': attempt['end_time'],
+            'event_details': f"User {attempt['user_id']} exam ended for quiz {attempt['quiz_id']}. Reason: Time up"
+        } for attempt in closed])
+        notifications.extend({
+            'recipient_email': attempt['recipient_email'],
+            'quiz_id': attempt['quiz_id'],
+            'attempt_id': attempt['attempt_id'],
+            'status': 'Ended',
+            'score_details': attempt['score_details']
+        } for attempt in closed)
+
+    if notifications:
+        send_exam_status_email_batch.delay(notifications)
+        print(f"Finalized {len(notifications)} expired quiz attempts")
+    return len(notifications)
+
+# Warm the caches of quizzes going live today and tomorrow before the midnight rush
+@celery_app.task(name="prewarm_upcoming_quizzes")
+def prewarm_upcoming_quizzes():
+    today = get_current_ist().date()
+    quiz_ids = [
+        quiz_id for (quiz_id,) in Quiz.query.with_entities(Quiz.id).filter(
+            Quiz.date_of_quiz.between(today, today + timedelta(days=1)),
+            Quiz.visibility.is_(True)
+        )
+    ]
+    warmed = 0
+    for quiz_id in quiz_ids:
+        try:
+            warmed += warm_quiz_cache(quiz_id)
+        except Exception as e:
+            print(f"Error warming cache of quiz {quiz_id}: {str(e)}")
+    print(f"Pre-warmed {warmed}/{len(quiz_ids)} upcoming quizzes")
+    return warmed
+
+# Catch Redis tab-switch counters up with the durable event log
+@celery_app.task(name="reconcile_tab_switch_counters")
+def reconcile_tab_switch_counters():
+    reconciled = reconcile_tab_switch_counts()
+    if reconciled:
+        print(f"Reconciled tab switch counters of {reconciled} attempts")
+    return reconciled
+
+# Drop finalized attempts that the live monitor still counts as active
+@celery_app.task(name="reconcile_live_exam_counters")
+def reconcile_live_exam_counters():
+    reconciled = reconcile_live_attempts()
+    if reconciled:
+        print(f"Removed {reconciled} finalized attempts from live exam counters")
+    return reconciled
+
+# Regrade every attempt of a quiz after its answer key changed, chunk by chunk
+@celery_app.task(name="regrade_quiz_attempts", bind=True)
+def regrade_quiz_attempts(self, quiz_id, chunk_size=REGRADE_CHUNK_SIZE):
+    total = QuizAttempt.query.filter_by(quiz_id=quiz_id).count()
+    regraded, last_attempt_id = 0, 0
+    while True:
+        last_attempt_id, chunk = regrade_attempt_chunk(quiz_id, last_attempt_id, chunk_size)
+        if not chunk:
+            break
+        regraded += chunk
+        self.update_state(state='PROGRESS', meta={'quiz_id': quiz_id, 'regraded': regraded, 'total': max(total, regraded)})
+    print(f"Regraded {regraded} attempts of quiz {quiz_id}")
+    return {'quiz_id': quiz_id, 'regraded': regraded, 'total': max(total, regraded)}
+
+# Derive per-question dwell times of finished attempts from their event logs
+@celery_app.task(name="compute_question_dwell_times")
+def compute_question_dwell_times_task(max_batches=20):
+    processed = 0
+    for _ in range(max_batches):
+        batch = compute_question_dwell_times(get_current_ist().replace(tzinfo=None))
+        if not batch:
+            break
+        processed += batch
+    if processed:
+        print(f"Computed question dwell times of {processed} quiz attempts")
+    return processed
            
 # Periodic Task Scheduling
 @celery_app.on_after_configure.connect
@@ -482,5 +618,54 @@ def setup_periodic_tasks(sender, **kwargs):
         send_quiz_endorsement_google_chat_notification.s(),
         name="send-quiz-endorsement-google-chat-notification"
     )
+
+    # Quiz event log write-behind buffer (every 5 seconds)
+    sender.add_periodic_task(
+        5.0,
+        flush_quiz_event_logs.s(),
+        name="flush-quiz-event-logs"
+    )
+
+    # User activity write-behind buffer (every 5 seconds, or as soon as a batch fills)
+    sender.add_periodic_task(
+        5.0,
+        flush_user_activity_logs.s(),
+        name="flush-user-activity-logs"
+    )
+
+    # Quiz cache pre-warm before quizzes go live (11:45 PM IST)
+    sender.add_periodic_task(
+        crontab(hour=23, minute=45),
+        prewarm_upcoming_quizzes.s(),
+        name="prewarm-upcoming-quizzes"
+    )
+
+    # Expired attempt sweep (every minute)
+    sender.add_periodic_task(
+        60.0,
+        finalize_expired_attempts.s(),
+        name="finalize-expired-attempts"
+    )
+
+    # Tab-switch counter reconciliation (every minute)
+    sender.add_periodic_task(
+        60.0,
+        reconcile_tab_switch_counters.s(),
+        name="reconcile-tab-switch-counters"
+    )
+
+    # Live exam counter reconciliation (every 5 minutes)
+    sender.add_periodic_task(
+        300.0,
+        reconcile_live_exam_counters.s(),
+        name="reconcile-live-exam-counters"
+    )
+
+    # Question dwell-time analytics (every 10 minutes)
+    sender.add_periodic_task(
+        600.0,
+        compute_question_dwell_times_task.s(),
+        name="compute-question-dwell-times"
+    )
     
     
\ No newline at end of file
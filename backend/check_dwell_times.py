@@ -0,0 +1,102 @@
+# /check_dwell_times.py
+# Replays known event sequences through dwell_time_rows and fails if the dwell times differ from
+# what the candidate actually spent on each question.
+# Runs against a throwaway in-memory SQLite database, no .env needed:
+#   python check_dwell_times.py
+import sys
+from datetime import datetime, timedelta
+from flask import Flask
+from model import db, Admin, Subject, Chapter, Quiz, Question, User, QuizAttempt, QuizEventLog
+from analytics_utils import dwell_time_rows
+
+# (name, [(seconds from start, event type, question number or None)], {question number: dwell seconds})
+SEQUENCES = [
+    (
+        "save & next without navigation events",
+        [(0, 'START_EXAM', None), (60, 'SAVE_RESPONSE', 1), (70, 'SAVE_RESPONSE', 2),
+         (200, 'SAVE_RESPONSE', 3), (210, 'END_EXAMINATION', None)],
+        {1: 60, 2: 10, 3: 130}
+    ),
+    (
+        "save & next followed by its navigation event",
+        [(0, 'START_EXAM', None), (60, 'SAVE_RESPONSE', 1), (60, 'QUESTION_NUMBER_CLICK', 2),
+         (70, 'SAVE_RESPONSE', 2), (70, 'QUESTION_NUMBER_CLICK', 3), (200, 'SAVE_RESPONSE', 3),
+         (210, 'END_EXAMINATION', None)],
+        {1: 60, 2: 10, 3: 130}
+    ),
+    (
+        "tab switch stays on the question on screen",
+        [(0, 'START_EXAM', None), (5, 'QUESTION_NUMBER_CLICK', 2), (15, 'TAB_SWITCH_WARNING', None),
+         (45, 'MARK_FOR_REVIEW', 2), (45, 'QUESTION_NUMBER_CLICK', 3), (50, 'QUESTION_NUMBER_CLICK', 4),
+         (80, 'CLEAR_RESPONSE', 4), (90, 'TAB_SWITCH_WARNING', None), (100, 'END_EXAMINATION', None)],
+        {2: 45, 3: 5, 4: 50}
+    ),
+]
+
+
+def create_check_app():
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db.init_app(app)
+    return app
+
+
+def seed_sequence(quiz, questions, user, events):
+    """Create an attempt whose event log is `events`; returns its id."""
+    started = datetime(2025, 1, 1, 10, 0, 0)
+    quiz_attempt = QuizAttempt(user_id=user.id, quiz_id=quiz.id, quiz_start_time=started)
+    db.session.add(quiz_attempt)
+    db.session.flush()
+    db.session.add_all([
+        QuizEventLog(
+            user_id=user.id,
+            quiz_attempt_id=quiz_attempt.id,
+            question_id=questions[number].id if number else None,
+            event_type=event_type,
+            event_timestamp=started + timedelta(seconds=offset)
+        ) for offset, event_type, number in events
+    ])
+    db.session.commit()
+    return quiz_attempt.id
+
+
+def run_checks():
+    app = create_check_app()
+    failures = 0
+    with app.app_context():
+        db.create_all()
+        admin = Admin(username="check", email="check@example.com", password="x", full_name="Check Admin")
+        user = User(username="candidate", email="candidate@example.com", password="x", full_name="Candidate")
+        db.session.add_all([admin, user])
+        db.session.flush()
+        subject = Subject(name="Check", admin_id=admin.id)
+        db.session.add(subject)
+        db.session.flush()
+        chapter = Chapter(subject_id=subject.id, admin_id=admin.id, name="Check")
+        db.session.add(chapter)
+        db.session.flush()
+        quiz = Quiz(chapter_id=chapter.id, admin_id=admin.id, date_of_quiz=datetime(2025, 1, 1).date(), time_duration=60)
+        db.session.add(quiz)
+        db.session.flush()
+        questions = {
+            number: Question(
+                quiz_id=quiz.id, admin_id=admin.id, question_statement=f"Question {number}",
+                option1="A", option2="B", option3="C", option4="D", correct_option="option1", difficulty="easy"
+            ) for number in range(1, 6)
+        }
+        db.session.add_all(questions.values())
+        db.session.commit()
+        numbers = {question.id: number for number, question in questions.items()}
+
+        for name, events, expected in SEQUENCES:
+            attempt_id = seed_sequence(quiz, questions, user, events)
+            actual = {numbers[row['question_id']]: row['dwell_seconds'] for row in dwell_time_rows([attempt_id])}
+            status = "ok" if actual == expected else "FAIL"
+            failures += actual != expected
+            print(f"{status:>4}  {name}: expected {expected}, got {actual}")
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(1 if run_checks() else 0)
@@ -75,6 +75,9 @@ class Config:
     except KeyError as e:
         raise KeyError(f"Missing required environment variable: {e}")
     
+    # Reverse proxies in front of the app: how many X-Forwarded-For hops to trust (0 = none, use the socket peer)
+    PROXY_FIX_X_FOR = int(os.getenv("PROXY_FIX_X_FOR", 0))
+
     try:
         # Frontend URL for CORS
         FRONTEND_URL = os.getenv("FRONTEND_URL")
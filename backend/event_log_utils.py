@@ -0,0 +1,53 @@
+# /event_log_utils.py
+import json
+from datetime import datetime
+from model import QuizEventLog, get_current_ist
+from setup_redis import redis_store
+from buffer_utils import drain_buffer
+
+EVENT_BUFFER_KEY = "quiz_events:buffer"
+EVENT_FLUSH_BATCH_SIZE = 500
+
+
+def log_quiz_events(events):
+    """Append several QuizEventLog rows to the Redis buffer in one round trip.
+
+    Each event is a dict of log_quiz_event keyword arguments.
+    """
+    rows = []
+    for event in events:
+        event_timestamp = event.get('event_timestamp') or get_current_ist()
+        row = {
+            'user_id': event['user_id'],
+            'quiz_attempt_id': event['quiz_attempt_id'],
+            'question_id': event.get('question_id'),
+            'event_type': event['event_type'],
+            'event_timestamp': event_timestamp.isoformat(),
+            'event_details': event.get('event_details')
+        }
+        rows.append(json.dumps(row))
+    if rows:
+        redis_store.rpush(EVENT_BUFFER_KEY, *rows)
+
+
+def log_quiz_event(user_id, quiz_attempt_id, event_type, event_details, question_id=None, event_timestamp=None):
+    """Append a QuizEventLog row to the Redis buffer."""
+    log_quiz_events([{
+        'user_id': user_id,
+        'quiz_attempt_id': quiz_attempt_id,
+        'question_id': question_id,
+        'event_type': event_type,
+        'event_timestamp': event_timestamp,
+        'event_details': event_details
+    }])
+
+
+def _decode_event(raw_event):
+    event = json.loads(raw_event)
+    event['event_timestamp'] = datetime.fromisoformat(event['event_timestamp'])
+    return event
+
+
+def flush_quiz_event_buffer(batch_size=EVENT_FLUSH_BATCH_SIZE):
+    """Move up to `batch_size` buffered events into quiz_event_logs with one bulk insert."""
+    return drain_buffer(EVENT_BUFFER_KEY, QuizEventLog, _decode_event, batch_size)
@@ -0,0 +1,293 @@
+# /exam_session_utils.py
+import json
+import time
+from datetime import timedelta
+import pytz
+from sqlalchemy import func
+from model import db, Quiz, QuizAttempt, QuestionAttempt, QuizEventLog
+from setup_redis import redis_store
+
+IST = pytz.timezone("Asia/Kolkata")
+EXAM_SESSION_GRACE = 15 * 60  # keep sessions 15 minutes past the deadline
+REVIEW_MARKS_TIMEOUT = 24 * 60 * 60  # 1 day
+TAB_SWITCH_ATTEMPTS_KEY = "exam_session:tab_switch_attempts"
+EXAM_STREAM_TICK = 15  # seconds between remaining-time pushes
+ANSWERS_LOADED_FIELD = '_loaded'  # present once the answers record mirrors question_attempts
+
+
+def _session_key(quiz_attempt_id):
+    return f"exam_session:{quiz_attempt_id}"
+
+
+def _review_key(quiz_attempt_id):
+    return f"exam_session:{quiz_attempt_id}:review"
+
+
+def _tab_switch_key(quiz_attempt_id):
+    return f"exam_session:{quiz_attempt_id}:tab_switches"
+
+
+def _answers_key(quiz_attempt_id):
+    return f"exam_session:{quiz_attempt_id}:answers"
+
+
+def _channel_key(quiz_attempt_id):
+    return f"exam_session:{quiz_attempt_id}:channel"
+
+
+def create_exam_session(quiz_attempt_id, user_id, quiz_id, access_token, start_time, time_duration, ended=False, shuffle_seed=None, answers=None):
+    """Store attempt_id -> (user, quiz, token, deadline, ended, shuffle seed) so exam routes never read QuizAttempt.
+
+    Also (re)writes the attempt's answers record from `answers` ({question_id: option}).
+    """
+    deadline = start_time + timedelta(minutes=time_duration)
+    key = _session_key(quiz_attempt_id)
+    ttl = max(int(deadline.timestamp() - time.time()), 0) + EXAM_SESSION_GRACE
+    pipe = redis_store.pipeline()
+    pipe.hset(key, mapping={
+        'user_id': user_id,
+        'quiz_id': quiz_id,
+        'access_token': access_token or '',
+        'start_time': start_time.timestamp(),
+        'deadline': deadline.timestamp(),
+        'ended': 1 if ended else 0,
+        'shuffle_seed': '' if shuffle_seed is None else shuffle_seed
+    })
+    pipe.expire(key, ttl)
+    _stage_answers_record(pipe, quiz_attempt_id, answers or {}, ttl)
+    pipe.execute()
+
+
+def _stage_answers_record(pipe, quiz_attempt_id, answers, ttl):
+    key = _answers_key(quiz_attempt_id)
+    pipe.delete(key)
+    pipe.hset(key, mapping=dict(answers, **{ANSWERS_LOADED_FIELD: 1}))
+    pipe.expire(key, ttl)
+
+
+def load_saved_answers(quiz_attempt_id):
+    """Read an attempt's saved answers {question_id: option} from question_attempts."""
+    return {
+        question_id: selected_option
+        for question_id, selected_option in db.session.query(QuestionAttempt.question_id, QuestionAttempt.selected_option)
+        .filter(QuestionAttempt.quiz_attempt_id == quiz_attempt_id, QuestionAttempt.question_id.isnot(None))
+    }
+
+
+def get_exam_session(quiz_attempt_id):
+    """Return the cached exam session of an attempt, or None on a miss."""
+    raw_session = redis_store.hgetall(_session_key(quiz_attempt_id))
+    if not raw_session:
+        return None
+    exam_session = {key.decode(): value.decode() for key, value in raw_session.items()}
+    return {
+        'quiz_attempt_id': quiz_attempt_id,
+        'user_id': int(exam_session['user_id']),
+        'quiz_id': int(exam_session['quiz_id']),
+        'access_token': exam_session['access_token'],
+        'start_time': float(exam_session['start_time']),
+        'deadline': float(exam_session['deadline']),
+        'ended': exam_session['ended'] == '1',
+        'shuffle_seed': int(exam_session['shuffle_seed']) if exam_session.get('shuffle_seed') else None
+    }
+
+
+def load_exam_session(quiz_attempt_id):
+    """Return the exam session of an attempt, rebuilding it from the database after a Redis miss."""
+    exam_session = get_exam_session(quiz_attempt_id)
+    if exam_session is not None:
+        return exam_session
+
+    quiz_attempt = db.session.get(QuizAttempt, quiz_attempt_id)
+    if not quiz_attempt or not quiz_attempt.quiz_start_time:
+        return None
+    quiz = db.session.get(Quiz, quiz_attempt.quiz_id) if quiz_attempt.quiz_id else None
+    create_exam_session(
+        quiz_attempt.id,
+        quiz_attempt.user_id,
+        quiz_attempt.quiz_id or 0,
+        quiz_attempt.access_token,
+        IST.localize(quiz_attempt.quiz_start_time),
+        quiz.time_duration if quiz else 0,
+        ended=quiz_attempt.quiz_end_time is not None or quiz is None,
+        shuffle_seed=quiz_attempt.shuffle_seed,
+        answers=load_saved_answers(quiz_attempt_id)
+    )
+    return get_exam_session(quiz_attempt_id)
+
+
+def end_exam_sessions(quiz_attempt_ids, reason=None):
+    """Clear the sessions of finalized attempts and tell their open streams; a late request rebuilds one once, flagged as ended."""
+    if not quiz_attempt_ids:
+        return
+    pipe = redis_store.pipeline()
+    for quiz_attempt_id in quiz_attempt_ids:
+        pipe.delete(
+            _session_key(quiz_attempt_id), _review_key(quiz_attempt_id),
+            _tab_switch_key(quiz_attempt_id), _answers_key(quiz_attempt_id)
+        )
+        pipe.publish(_channel_key(quiz_attempt_id), json.dumps({'type': 'ended', 'reason': reason}))
+    pipe.srem(TAB_SWITCH_ATTEMPTS_KEY, *quiz_attempt_ids)
+    pipe.execute()
+
+
+def end_exam_session(quiz_attempt_id, reason=None):
+    """Clear a finalized attempt's session."""
+    end_exam_sessions([quiz_attempt_id], reason)
+
+
+def set_review_marks(quiz_attempt_id, marks):
+    """Apply (question_id, marked) toggles to an attempt's review set; returns the net change in marked questions."""
+    key = _review_key(quiz_attempt_id)
+    pipe = redis_store.pipeline()
+    for question_id, marked in marks:
+        if marked:
+            pipe.sadd(key, question_id)
+        else:
+            pipe.srem(key, question_id)
+    pipe.expire(key, REVIEW_MARKS_TIMEOUT)
+    results = pipe.execute()
+    return sum(
+        changed if marked else -changed
+        for (_, marked), changed in zip(marks, results)
+    )
+
+
+def incr_tab_switch_count(exam_session):
+    """Atomically count a tab switch and return the attempt's total; the counter lives until the deadline."""
+    quiz_attempt_id = exam_session['quiz_attempt_id']
+    key = _tab_switch_key(quiz_attempt_id)
+    ttl = max(int(exam_session['deadline'] - time.time()), 0) + EXAM_SESSION_GRACE
+    pipe = redis_store.pipeline()
+    pipe.incr(key)
+    pipe.expire(key, ttl)
+    pipe.sadd(TAB_SWITCH_ATTEMPTS_KEY, quiz_attempt_id)
+    return pipe.execute()[0]
+
+
+def record_answer_events(quiz_attempt_id, events):
+    """Mirror committed SAVE_RESPONSE/CLEAR_RESPONSE/DELETE_ANSWER events into the attempt's answers record."""
+    key = _answers_key(quiz_attempt_id)
+    pipe = redis_store.pipeline()
+    changed = False
+    for event in events:
+        if event['event_type'] == 'SAVE_RESPONSE':
+            pipe.hset(key, event['question_id'], event['selected_option'])
+            changed = True
+        elif event['event_type'] in ('CLEAR_RESPONSE', 'DELETE_ANSWER'):
+            pipe.hdel(key, event['question_id'])
+            changed = True
+    if changed:
+        pipe.execute()
+
+
+def get_attempt_state(exam_session):
+    """Read an attempt's answers, review marks and tab-switch count in one round trip.
+
+    Falls back to question_attempts (one indexed query) if the answers record was lost.
+    """
+    quiz_attempt_id = exam_session['quiz_attempt_id']
+    pipe = redis_store.pipeline()
+    pipe.hgetall(_answers_key(quiz_attempt_id))
+    pipe.smembers(_review_key(quiz_attempt_id))
+    pipe.get(_tab_switch_key(quiz_attempt_id))
+    raw_answers, raw_review, tab_switches = pipe.execute()
+
+    answers = {key.decode(): value.decode() for key, value in raw_answers.items()}
+    if answers.pop(ANSWERS_LOADED_FIELD, None) is None:
+        saved_answers = load_saved_answers(quiz_attempt_id)
+        pipe = redis_store.pipeline()
+        _stage_answers_record(pipe, quiz_attempt_id, saved_answers, max(int(exam_session['deadline'] - time.time()), 0) + EXAM_SESSION_GRACE)
+        pipe.execute()
+    else:
+        saved_answers = {int(question_id): option for question_id, option in answers.items()}
+    return {
+        'answers': saved_answers,
+        'marked_for_review': sorted(int(question_id) for question_id in raw_review),
+        'warning_count': int(tab_switches or 0)
+    }
+
+
+def get_tab_switch_count(quiz_attempt_id):
+    """Return the number of tab switches counted for an attempt."""
+    return int(redis_store.get(_tab_switch_key(quiz_attempt_id)) or 0)
+
+
+def reconcile_tab_switch_counts():
+    """Raise tab-switch counters that fell behind the durable event log (e.g. after a Redis failover)."""
+    attempt_ids = [int(attempt_id) for attempt_id in redis_store.smembers(TAB_SWITCH_ATTEMPTS_KEY)]
+    if not attempt_ids:
+        return 0
+
+    pipe = redis_store.pipeline()
+    for attempt_id in attempt_ids:
+        pipe.get(_tab_switch_key(attempt_id))
+    counters = dict(zip(attempt_ids, pipe.execute()))
+    expired = [attempt_id for attempt_id, count in counters.items() if count is None]
+    if expired:
+        redis_store.srem(TAB_SWITCH_ATTEMPTS_KEY, *expired)
+    live = {attempt_id: int(count) for attempt_id, count in counters.items() if count is not None}
+    if not live:
+        return 0
+
+    durable_counts = dict(
+        db.session.query(QuizEventLog.quiz_attempt_id, func.count(QuizEventLog.id))
+        .filter(
+            QuizEventLog.quiz_attempt_id.in_(list(live)),
+            QuizEventLog.event_type == 'TAB_SWITCH_WARNING'
+        )
+        .group_by(QuizEventLog.quiz_attempt_id)
+        .all()
+    )
+    behind = {
+        attempt_id: durable_counts[attempt_id] - count
+        for attempt_id, count in live.items()
+        if durable_counts.get(attempt_id, 0) > count
+    }
+    if behind:
+        # INCRBY rather than SET so switches counted meanwhile are not lost
+        pipe = redis_store.pipeline()
+        for attempt_id, missing in behind.items():
+            pipe.incrby(_tab_switch_key(attempt_id), missing)
+        pipe.execute()
+    return len(behind)
+
+
+def publish_exam_event(quiz_attempt_id, event_type, payload):
+    """Push an event to every open stream of an attempt, whichever worker serves it."""
+    redis_store.publish(_channel_key(quiz_attempt_id), json.dumps(dict(payload, type=event_type)))
+
+
+def _sse(event_type, payload):
+    return f"event: {event_type}\ndata: {json.dumps(payload)}\n\n"
+
+
+def stream_exam_session(exam_session):
+    """Yield Server-Sent Events for an attempt: remaining time every tick, plus published warnings and termination."""
+    quiz_attempt_id = exam_session['quiz_attempt_id']
+    pubsub = redis_store.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(_channel_key(quiz_attempt_id))
+    try:
+        yield _sse('state', {
+            'remaining_seconds': max(int(exam_session['deadline'] - time.time()), 0),
+            'warning_count': get_tab_switch_count(quiz_attempt_id)
+        })
+        next_tick = time.monotonic() + EXAM_STREAM_TICK
+        while True:
+            remaining = exam_session['deadline'] - time.time()
+            if remaining <= 0:
+                yield _sse('ended', {'reason': 'Time expired'})
+                return
+
+            message = pubsub.get_message(timeout=min(max(next_tick - time.monotonic(), 0), remaining))
+            if message and message['type'] == 'message':
+                event = json.loads(message['data'])
+                yield _sse(event['type'], event)
+                if event['type'] == 'ended':
+                    return
+
+            if time.monotonic() >= next_tick:
+                yield _sse('tick', {'remaining_seconds': int(remaining)})
+                next_tick += EXAM_STREAM_TICK
+    finally:
+        pubsub.close()
@@ -0,0 +1,249 @@
+# /grading_utils.py
+from collections import Counter
+from datetime import timedelta
+from sqlalchemy import func, case, update
+from model import db, User, Quiz, Question, QuizAttempt, QuestionAttempt
+
+EXPIRED_SWEEP_BATCH_SIZE = 500
+REGRADE_CHUNK_SIZE = 1000
+
+
+def answer_delta(answer_key, question_id, previous_option, selected_option):
+    """Return the QuizAttempt counter changes for an answer moving from previous_option to selected_option.
+
+    None stands for an unanswered question.
+    """
+    correct_option, score_value = answer_key[question_id][:2] if question_id in answer_key else (None, 0)
+    delta = Counter()
+    for option, sign in ((previous_option, -1), (selected_option, 1)):
+        if option is None:
+            continue
+        delta['total_attempted_qn'] += sign
+        delta['total_skipped_qn'] -= sign
+        if option == correct_option:
+            delta['total_correct_ans'] += sign
+            delta['total_score_earned'] += sign * score_value
+        else:
+            delta['total_wrong_ans'] += sign
+    return delta
+
+
+def _lock_attempts(attempts):
+    """Lock the attempts matched by a QuizAttempt query until commit; returns how many matched.
+
+    SQLite has no row locks, so there a no-op UPDATE takes the database write lock instead of SELECT ... FOR UPDATE.
+    """
+    if db.session.get_bind().dialect.name == 'sqlite':
+        return attempts.update({QuizAttempt.id: QuizAttempt.id}, synchronize_session=False)
+    return len(attempts.with_entities(QuizAttempt.id).order_by(QuizAttempt.id).with_for_update().all())
+
+
+def lock_open_attempt(quiz_attempt_id):
+    """Lock an attempt until commit so its answers are read and written one request at a time.
+
+    Returns False if the attempt is missing or already finalized.
+    """
+    return _lock_attempts(QuizAttempt.query.filter(
+        QuizAttempt.id == quiz_attempt_id,
+        QuizAttempt.quiz_end_time.is_(None)
+    )) == 1
+
+
+def apply_attempt_counters(quiz_attempt_id, counters):
+    """Add accumulated counter changes to an open attempt's total_* columns in one UPDATE."""
+    changes = {
+        getattr(QuizAttempt, column): getattr(QuizAttempt, column) + delta
+        for column, delta in counters.items() if delta
+    }
+    if changes:
+        QuizAttempt.query.filter(
+            QuizAttempt.id == quiz_attempt_id,
+            QuizAttempt.quiz_end_time.is_(None)
+        ).update(changes, synchronize_session=False)
+
+
+def get_score_details(quiz_attempt_id):
+    """Read the stored result of an attempt, or None if it does not exist."""
+    row = (
+        db.session.query(
+            QuizAttempt.total_score_earned, QuizAttempt.total_correct_ans,
+            QuizAttempt.total_time_taken, QuizAttempt.total_questions_count
+        )
+        .filter(QuizAttempt.id == quiz_attempt_id)
+        .one_or_none()
+    )
+    if row is None:
+        return None
+    return {
+        'total_score_earned': row.total_score_earned,
+        'total_correct_ans': row.total_correct_ans,
+        'total_time_taken': row.total_time_taken,
+        'total_questions': row.total_questions_count
+    }
+
+
+def finalize_quiz_attempt(quiz_attempt_id, start_timestamp, end_time):
+    """Close an attempt exactly once with UPDATE ... WHERE quiz_end_time IS NULL and commit.
+
+    Counters are already live, so nothing is regraded. Returns (score_details, finalized): only the
+    request whose UPDATE matched gets finalized=True; concurrent losers just read the stored result.
+    """
+    finalized = QuizAttempt.query.filter(
+        QuizAttempt.id == quiz_attempt_id,
+        QuizAttempt.quiz_end_time.is_(None)
+    ).update({
+        QuizAttempt.quiz_end_time: end_time.replace(tzinfo=None),
+        QuizAttempt.total_time_taken: max(int(end_time.timestamp() - start_timestamp), 0)
+    }, synchronize_session=False) == 1
+    db.session.commit()
+    return get_score_details(quiz_attempt_id), finalized
+
+
+def backfill_attempt_deadlines(batch_size=EXPIRED_SWEEP_BATCH_SIZE):
+    """Fill deadline_time on open attempts created before the column existed."""
+    rows = (
+        db.session.query(QuizAttempt.id, QuizAttempt.quiz_start_time, Quiz.time_duration)
+        .outerjoin(Quiz, Quiz.id == QuizAttempt.quiz_id)
+        .filter(
+            QuizAttempt.quiz_end_time.is_(None),
+            QuizAttempt.deadline_time.is_(None),
+            QuizAttempt.quiz_start_time.isnot(None)
+        )
+        .limit(batch_size)
+        .all()
+    )
+    if rows:
+        db.session.execute(update(QuizAttempt), [{
+            'id': row.id,
+            'deadline_time': row.quiz_start_time + timedelta(minutes=row.time_duration or 0)
+        } for row in rows])
+        db.session.commit()
+    return len(rows)
+
+
+def close_expired_attempts(now, batch_size=EXPIRED_SWEEP_BATCH_SIZE):
+    """Close up to `batch_size` open attempts whose deadline passed, stamping the deadline as their end time.
+
+    `now` is a naive IST datetime. Counters are already live, so closing is one bulk UPDATE.
+    Returns the email notification of every closed attempt.
+    """
+    rows = (
+        db.session.query(
+            QuizAttempt.id, QuizAttempt.user_id, QuizAttempt.quiz_id,
+            QuizAttempt.quiz_start_time, QuizAttempt.deadline_time,
+            QuizAttempt.total_score_earned, QuizAttempt.total_correct_ans,
+            QuizAttempt.total_questions_count, User.email
+        )
+        .join(User, User.id == QuizAttempt.user_id)
+        .filter(QuizAttempt.quiz_end_time.is_(None), QuizAttempt.deadline_time <= now)
+        .order_by(QuizAttempt.deadline_time)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True, of=QuizAttempt)
+        .all()
+    )
+    if not rows:
+        return []
+
+    closed = []
+    for row in rows:
+        total_time_taken = max(int((row.deadline_time - row.quiz_start_time).total_seconds()), 0)
+        closed.append({
+            'id': row.id,
+            'quiz_end_time': row.deadline_time,
+            'total_time_taken': total_time_taken
+        })
+    # A candidate submitting at the same moment wins: only still-open rows are stamped
+    db.session.execute(
+        update(QuizAttempt).where(QuizAttempt.quiz_end_time.is_(None)),
+        closed,
+        execution_options={'synchronize_session': None}
+    )
+    db.session.commit()
+    # executemany gives no per-row rowcount, so keep only the rows this sweep actually closed
+    swept = {
+        attempt_id for attempt_id, quiz_end_time, deadline_time in db.session.query(
+            QuizAttempt.id, QuizAttempt.quiz_end_time, QuizAttempt.deadline_time
+        ).filter(QuizAttempt.id.in_([row.id for row in rows]))
+        if quiz_end_time == deadline_time
+    }
+
+    return [{
+        'recipient_email': row.email,
+        'user_id': row.user_id,
+        'quiz_id': row.quiz_id,
+        'attempt_id': row.id,
+        'end_time': row.deadline_time,
+        'score_details': {
+            'total_score_earned': row.total_score_earned,
+            'total_correct_ans': row.total_correct_ans,
+            'total_time_taken': attempt['total_time_taken'],
+            'total_questions': row.total_questions_count
+        }
+    } for row, attempt in zip(rows, closed) if row.id in swept]
+
+
+def shift_attempt_max_scores(quiz_id, score_delta):
+    """Shift total_score of every attempt of a quiz in the caller's transaction (a question's score_value changed)."""
+    if not score_delta:
+        return
+    db.session.execute(
+        update(QuizAttempt)
+        .where(QuizAttempt.quiz_id == quiz_id)
+        .values(total_score=QuizAttempt.total_score + score_delta)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def regrade_attempt_chunk(quiz_id, after_id=0, chunk_size=REGRADE_CHUNK_SIZE, recount_answers=False):
+    """Regrade the next `chunk_size` attempts of a quiz (by id, after `after_id`) against the current answer key.
+
+    Locks the chunk's attempts, then one grouped join of question_attempts against questions and one
+    bulk UPDATE by primary key, in a single transaction. With recount_answers, total_attempted_qn and
+    total_skipped_qn are recomputed from the saved answers too (e.g. after duplicate answers were deleted).
+    Returns (last_attempt_id, attempts_regraded); (after_id, 0) once every attempt is done.
+    """
+    question_counts = dict(
+        db.session.query(QuizAttempt.id, QuizAttempt.total_questions_count)
+        .filter(QuizAttempt.quiz_id == quiz_id, QuizAttempt.id > after_id)
+        .order_by(QuizAttempt.id)
+        .limit(chunk_size)
+        .all()
+    )
+    attempt_ids = sorted(question_counts)
+    if not attempt_ids:
+        return after_id, 0
+    # Saves move the counters of open attempts by deltas under the same lock, so none can land
+    # between the aggregate read below and the absolute UPDATE
+    _lock_attempts(QuizAttempt.query.filter(QuizAttempt.id.in_(attempt_ids)))
+
+    is_correct = Question.correct_option == QuestionAttempt.selected_option
+    grades = {
+        row.quiz_attempt_id: row for row in db.session.query(
+            QuestionAttempt.quiz_attempt_id,
+            func.count(QuestionAttempt.id).label('answered'),
+            func.coalesce(func.sum(case((is_correct, 1), else_=0)), 0).label('correct'),
+            func.coalesce(func.sum(case((is_correct, Question.score_value), else_=0)), 0).label('score')
+        )
+        .join(Question, Question.id == QuestionAttempt.question_id)
+        .filter(QuestionAttempt.quiz_attempt_id.in_(attempt_ids))
+        .group_by(QuestionAttempt.quiz_attempt_id)
+    }
+
+    rows = []
+    for attempt_id in attempt_ids:
+        grade = grades.get(attempt_id)
+        answered = int(grade.answered) if grade else 0
+        correct = int(grade.correct) if grade else 0
+        row = {
+            'id': attempt_id,
+            'total_correct_ans': correct,
+            'total_wrong_ans': answered - correct,
+            'total_score_earned': float(grade.score) if grade else 0.0
+        }
+        if recount_answers:
+            row['total_attempted_qn'] = answered
+            row['total_skipped_qn'] = max((question_counts[attempt_id] or 0) - answered, 0)
+        rows.append(row)
+    db.session.execute(update(QuizAttempt), rows)
+    db.session.commit()
+    return attempt_ids[-1], len(attempt_ids)
@@ -0,0 +1,128 @@
+# /live_monitor_utils.py
+import time
+from model import db, QuizAttempt
+from setup_redis import redis_store
+
+LIVE_QUIZZES_KEY = "live:quizzes"
+LIVE_ATTEMPTS_TIMEOUT = 24 * 60 * 60  # 1 day, refreshed on every start
+LIVE_BUCKET_TIMEOUT = 2 * 60 * 60  # per-minute buckets outlive the longest window
+MAX_LIVE_WINDOW_MINUTES = 60
+
+
+def _active_key(quiz_id):
+    return f"live:quiz:{quiz_id}:active"
+
+
+def _bucket_key(quiz_id, metric, minute):
+    return f"live:quiz:{quiz_id}:{metric}:{minute}"
+
+
+def _current_minute():
+    return int(time.time() // 60)
+
+
+def record_attempt_started(quiz_id, quiz_attempt_id):
+    """Count an attempt as active in its quiz; repeated starts of the same attempt count once."""
+    pipe = redis_store.pipeline()
+    pipe.sadd(_active_key(quiz_id), quiz_attempt_id)
+    pipe.expire(_active_key(quiz_id), LIVE_ATTEMPTS_TIMEOUT)
+    pipe.sadd(LIVE_QUIZZES_KEY, quiz_id)
+    pipe.execute()
+
+
+def record_attempts_finished(finished):
+    """Move finalized attempts out of their quizzes' active sets and count them as submissions.
+
+    `finished` is a list of (quiz_id, quiz_attempt_id) pairs, as produced by one sweep or one request.
+    """
+    if not finished:
+        return
+    minute = _current_minute()
+    pipe = redis_store.pipeline()
+    for quiz_id, quiz_attempt_id in finished:
+        if quiz_id is None:
+            continue
+        bucket = _bucket_key(quiz_id, 'submissions', minute)
+        pipe.srem(_active_key(quiz_id), quiz_attempt_id)
+        pipe.incr(bucket)
+        pipe.expire(bucket, LIVE_BUCKET_TIMEOUT)
+        pipe.sadd(LIVE_QUIZZES_KEY, quiz_id)
+    pipe.execute()
+
+
+def record_tab_warning(quiz_id):
+    """Count a tab-switch warning in the quiz's current minute."""
+    bucket = _bucket_key(quiz_id, 'tab_warnings', _current_minute())
+    pipe = redis_store.pipeline()
+    pipe.incr(bucket)
+    pipe.expire(bucket, LIVE_BUCKET_TIMEOUT)
+    pipe.sadd(LIVE_QUIZZES_KEY, quiz_id)
+    pipe.execute()
+
+
+def get_live_quiz_stats(window_minutes=5):
+    """Return active attempts and per-minute submissions/tab warnings (oldest first) of every live quiz.
+
+    Costs one pipelined round trip of O(quizzes * window) commands; quizzes with nothing going on are pruned.
+    """
+    window_minutes = min(max(window_minutes, 1), MAX_LIVE_WINDOW_MINUTES)
+    quiz_ids = sorted(int(quiz_id) for quiz_id in redis_store.smembers(LIVE_QUIZZES_KEY))
+    if not quiz_ids:
+        return []
+
+    minutes = range(_current_minute() - window_minutes + 1, _current_minute() + 1)
+    pipe = redis_store.pipeline()
+    for quiz_id in quiz_ids:
+        pipe.scard(_active_key(quiz_id))
+        pipe.mget([_bucket_key(quiz_id, 'submissions', minute) for minute in minutes])
+        pipe.mget([_bucket_key(quiz_id, 'tab_warnings', minute) for minute in minutes])
+    results = pipe.execute()
+
+    stats, idle = [], []
+    for index, quiz_id in enumerate(quiz_ids):
+        active, submissions, tab_warnings = results[3 * index:3 * index + 3]
+        submissions = [int(count or 0) for count in submissions]
+        tab_warnings = [int(count or 0) for count in tab_warnings]
+        if not active and not any(submissions) and not any(tab_warnings):
+            idle.append(quiz_id)
+            continue
+        stats.append({
+            'quiz_id': quiz_id,
+            'active_attempts': active,
+            'submissions_per_minute': submissions,
+            'tab_warnings_per_minute': tab_warnings
+        })
+    if idle:
+        redis_store.srem(LIVE_QUIZZES_KEY, *idle)
+    return stats
+
+
+def reconcile_live_attempts():
+    """Drop attempts from the active sets once the database shows them finalized (e.g. a crash between commit and Redis)."""
+    quiz_ids = [int(quiz_id) for quiz_id in redis_store.smembers(LIVE_QUIZZES_KEY)]
+    if not quiz_ids:
+        return 0
+
+    pipe = redis_store.pipeline()
+    for quiz_id in quiz_ids:
+        pipe.smembers(_active_key(quiz_id))
+    active = {
+        int(attempt_id): quiz_id
+        for quiz_id, attempt_ids in zip(quiz_ids, pipe.execute())
+        for attempt_id in attempt_ids
+    }
+    if not active:
+        return 0
+
+    finished = [
+        (active[attempt_id], attempt_id) for (attempt_id,) in db.session.query(QuizAttempt.id).filter(
+            QuizAttempt.id.in_(list(active)),
+            QuizAttempt.quiz_end_time.isnot(None)
+        )
+    ]
+    if finished:
+        pipe = redis_store.pipeline()
+        for quiz_id, attempt_id in finished:
+            pipe.srem(_active_key(quiz_id), attempt_id)
+        pipe.execute()
+    return len(finished)
@@ -0,0 +1,96 @@
+# /login_throttle_utils.py
+import time
+import uuid
+from setup_redis import redis_store
+
+LOGIN_WINDOW_SECONDS = 5 * 60
+LOGIN_EMAIL_LIMIT = 10  # attempts per account per window
+LOGIN_IP_LIMIT = 50  # failed attempts per client IP per window (covers stuffing across many accounts)
+LOGIN_THROTTLE_STATS_KEY = "login_throttle:stats"
+
+# Sliding window over sorted sets of attempt timestamps (ms). Checks both windows, then records the
+# attempt in both, in one atomic step; returns 0 if allowed or the milliseconds until a slot frees up.
+# KEYS: email window, IP window, stats hash. ARGV: now, window, email limit, IP limit, attempt id.
+_THROTTLE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local limits = {tonumber(ARGV[3]), tonumber(ARGV[4])}
+local retry_after = 0
+for i = 1, 2 do
+    redis.call('ZREMRANGEBYSCORE', KEYS[i], '-inf', now - window)
+    if redis.call('ZCARD', KEYS[i]) >= limits[i] then
+        local oldest = redis.call('ZRANGE', KEYS[i], 0, 0, 'WITHSCORES')
+        retry_after = math.max(retry_after, tonumber(oldest[2]) + window - now)
+    end
+end
+if retry_after > 0 then
+    redis.call('HINCRBY', KEYS[3], 'throttled', 1)
+    return retry_after
+end
+for i = 1, 2 do
+    redis.call('ZADD', KEYS[i], now, ARGV[5])
+    redis.call('PEXPIRE', KEYS[i], window)
+end
+redis.call('HINCRBY', KEYS[3], 'allowed', 1)
+return 0
+"""
+_throttle_script = None
+
+
+def _email_key(role, email):
+    return f"login_throttle:{role}:email:{email.strip().lower()}"
+
+
+def _ip_key(client_ip):
+    return f"login_throttle:ip:{client_ip}"
+
+
+def check_login_throttle(role, email, client_ip):
+    """Count a login attempt against its account and IP windows.
+
+    Returns (seconds to wait, attempt id): 0 seconds if it may proceed, and the id to hand to
+    reset_login_throttle if the login then succeeds. Call before check_password_hash so throttled
+    attempts cost no hashing. Fails open if Redis is unavailable.
+    Pass request.remote_addr as client_ip, never a client-supplied header such as X-Forwarded-For.
+    """
+    global _throttle_script
+    attempt_id = uuid.uuid4().hex
+    try:
+        if _throttle_script is None:
+            _throttle_script = redis_store.register_script(_THROTTLE_SCRIPT)
+        retry_after_ms = _throttle_script(
+            keys=[_email_key(role, email), _ip_key(client_ip), LOGIN_THROTTLE_STATS_KEY],
+            args=[int(time.time() * 1000), LOGIN_WINDOW_SECONDS * 1000, LOGIN_EMAIL_LIMIT, LOGIN_IP_LIMIT, attempt_id]
+        )
+    except Exception as e:
+        print(f"Error checking login throttle: {e}")
+        return 0, attempt_id
+    return -(-int(retry_after_ms) // 1000), attempt_id  # round up to whole seconds
+
+
+def reset_login_throttle(role, email, client_ip, attempt_id):
+    """After a successful login, forget the account's recent attempts and take this attempt out of the IP window.
+
+    Only failed attempts stay counted, so a cohort logging in from behind one NAT address is not locked out.
+    """
+    try:
+        pipe = redis_store.pipeline()
+        pipe.delete(_email_key(role, email))
+        pipe.zrem(_ip_key(client_ip), attempt_id)
+        pipe.execute()
+    except Exception as e:
+        print(f"Error resetting login throttle: {e}")
+
+
+def get_login_throttle_stats():
+    """Return how many login attempts were hashed and how many were rejected before hashing."""
+    stats = {key.decode(): int(value) for key, value in redis_store.hgetall(LOGIN_THROTTLE_STATS_KEY).items()}
+    allowed, throttled = stats.get('allowed', 0), stats.get('throttled', 0)
+    return {
+        'allowed': allowed,
+        'throttled': throttled,
+        'hashes_saved_pct': round(100.0 * throttled / (allowed + throttled), 2) if allowed + throttled else 0.0,
+        'window_seconds': LOGIN_WINDOW_SECONDS,
+        'email_limit': LOGIN_EMAIL_LIMIT,
+        'ip_limit': LOGIN_IP_LIMIT
+    }
@@ -0,0 +1,100 @@
+# migrate_schema.py
+# Brings a database created before the current model up to date; safe to run more than once:
+#   python migrate_schema.py
+# Adds the new columns, creates new tables and indexes, and removes duplicate answers so that
+# the one-answer-per-question unique index can be built. Run repair_quiz_totals.py afterwards.
+from sqlalchemy import inspect, text
+from app import app
+from model import db, QuizAttempt, QuestionAttempt
+from grading_utils import regrade_attempt_chunk
+
+# (table, column, DDL after the column type); the type is taken from the model
+NEW_COLUMNS = [
+    ('quizzes', 'question_count', 'NOT NULL DEFAULT 0'),
+    ('quizzes', 'max_score', 'NOT NULL DEFAULT 0'),
+    ('quiz_attempts', 'deadline_time', ''),
+    ('quiz_attempts', 'shuffle_seed', ''),
+    ('quiz_attempts', 'analytics_processed', 'NOT NULL DEFAULT FALSE'),
+]
+# Superseded by ix_quiz_event_logs_attempt_timestamp, which leads with the same column
+OBSOLETE_INDEXES = [('quiz_event_logs', 'ix_quiz_event_logs_quiz_attempt_id')]
+
+# Keeps the latest answer (by timestamp, then id) of every (attempt, question) pair
+DELETE_DUPLICATE_ANSWERS = text("""
+    DELETE FROM question_attempts
+    WHERE question_id IS NOT NULL AND EXISTS (
+        SELECT 1 FROM question_attempts AS newer
+        WHERE newer.quiz_attempt_id = question_attempts.quiz_attempt_id
+          AND newer.question_id = question_attempts.question_id
+          AND (newer.question_attempt_timestamp > question_attempts.question_attempt_timestamp
+               OR (newer.question_attempt_timestamp = question_attempts.question_attempt_timestamp
+                   AND newer.id > question_attempts.id))
+    )
+""")
+
+
+def add_missing_columns(connection):
+    inspector = inspect(connection)
+    for table_name, column_name, constraints in NEW_COLUMNS:
+        if column_name in {column['name'] for column in inspector.get_columns(table_name)}:
+            continue
+        column_type = db.metadata.tables[table_name].c[column_name].type.compile(dialect=connection.dialect)
+        connection.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type} {constraints}".strip()))
+        print(f"Added {table_name}.{column_name}")
+
+
+def remove_duplicate_answers(connection):
+    """Delete all but the latest answer per question; returns the quizzes whose attempts lost answers."""
+    duplicated = connection.execute(
+        db.select(QuestionAttempt.quiz_attempt_id)
+        .where(QuestionAttempt.question_id.isnot(None))
+        .group_by(QuestionAttempt.quiz_attempt_id, QuestionAttempt.question_id)
+        .having(db.func.count() > 1)
+    ).scalars().all()
+    if not duplicated:
+        return set()
+    quiz_ids = set(connection.execute(
+        db.select(QuizAttempt.quiz_id).where(QuizAttempt.id.in_(set(duplicated)), QuizAttempt.quiz_id.isnot(None))
+    ).scalars())
+    deleted = connection.execute(DELETE_DUPLICATE_ANSWERS).rowcount
+    print(f"Deleted {deleted} duplicate answers from {len(set(duplicated))} attempts")
+    return quiz_ids
+
+
+def create_missing_indexes(connection):
+    inspector = inspect(connection)
+    for table in db.metadata.sorted_tables:
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        existing |= {constraint['name'] for constraint in inspector.get_unique_constraints(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(connection)
+                print(f"Created index {index.name}")
+        for constraint in table.constraints:
+            if isinstance(constraint, db.UniqueConstraint) and constraint.name and constraint.name not in existing:
+                columns = ', '.join(column.name for column in constraint.columns)
+                connection.execute(text(f"CREATE UNIQUE INDEX {constraint.name} ON {table.name} ({columns})"))
+                print(f"Created unique index {constraint.name}")
+    for table_name, index_name in OBSOLETE_INDEXES:
+        if index_name in {index['name'] for index in inspector.get_indexes(table_name)}:
+            connection.execute(text(f"DROP INDEX {index_name}"))
+            print(f"Dropped index {index_name}")
+
+
+with app.app_context():
+    # New tables (question_dwell_times) come with their indexes
+    db.create_all()
+    with db.engine.begin() as connection:
+        add_missing_columns(connection)
+        regrade_quiz_ids = remove_duplicate_answers(connection)
+        create_missing_indexes(connection)
+
+    # Attempts that lost duplicate answers get every counter recomputed from what is left
+    for quiz_id in sorted(regrade_quiz_ids):
+        last_attempt_id = 0
+        while True:
+            last_attempt_id, chunk = regrade_attempt_chunk(quiz_id, last_attempt_id, recount_answers=True)
+            if not chunk:
+                break
+        print(f"Regraded the attempts of quiz {quiz_id}")
+    print("Schema migration complete.")
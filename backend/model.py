@@ -9,6 +9,13 @@ def get_current_ist():
     """Returns the current datetime in Asia/Kolkata timezone."""
     return datetime.now(pytz.timezone("Asia/Kolkata"))
 
+# Marks awarded for a correct answer, by question difficulty
+DIFFICULTY_SCORE_VALUES = {'easy': 1, 'medium': 2, 'hard': 4}
+
+def score_value_for(difficulty):
+    """Returns the score value of a question of the given difficulty (unknown difficulties count as easy)."""
+    return DIFFICULTY_SCORE_VALUES.get((difficulty or '').lower(), 1)
+
 # User Model
 class User(db.Model):
     __tablename__ = 'users'
@@ -87,6 +94,8 @@ class Quiz(db.Model):
     visibility = db.Column(db.Boolean, nullable=False, default=True)
     pay_required = db.Column(db.Boolean, nullable=False, default=False)
     pay_amount = db.Column(db.Float, nullable=False, default=0.0)
+    question_count = db.Column(db.Integer, nullable=False, default=0)  # Maintained by the question routes
+    max_score = db.Column(db.Integer, nullable=False, default=0)  # Sum of question score_value
     record_creation_timestamp = db.Column(db.DateTime, default=get_current_ist)
     
     # Cascade deletion for admin-managed questions
@@ -140,14 +149,7 @@ class Question(db.Model):
 
     def __init__(self, *args, **kwargs):
         super(Question, self).__init__(*args, **kwargs)
-        if self.difficulty.lower() == 'easy':
-            self.score_value = 1
-        elif self.difficulty.lower() == 'medium':
-            self.score_value = 2
-        elif self.difficulty.lower() == 'hard':
-            self.score_value = 4
-        else:
-            self.score_value = 1
+        self.score_value = score_value_for(self.difficulty)
 
 # QuizAttempt Model (user-generated)
 class QuizAttempt(db.Model):
@@ -169,9 +171,19 @@ class QuizAttempt(db.Model):
     total_time_taken = db.Column(db.Integer, nullable=False, default=0)
     quiz_start_time = db.Column(db.DateTime)
     quiz_end_time = db.Column(db.DateTime)
+    deadline_time = db.Column(db.DateTime)
+    shuffle_seed = db.Column(db.Integer, nullable=True)  # NULL: questions and options in paper order
+    analytics_processed = db.Column(db.Boolean, nullable=False, default=False)  # Dwell times computed
     access_token = db.Column(db.String, nullable=True)  
     record_creation_timestamp = db.Column(db.DateTime, default=get_current_ist)
     
+    # Serves the expired-attempt sweep: open attempts (quiz_end_time IS NULL) ordered by deadline,
+    # and the analytics job: finished attempts not yet processed
+    __table_args__ = (
+        db.Index('ix_quiz_attempts_open_deadline', 'quiz_end_time', 'deadline_time'),
+        db.Index('ix_quiz_attempts_analytics_pending', 'analytics_processed', 'quiz_end_time'),
+    )
+    
     # Cascade deletion for user-managed question attempts
     question_attempts = db.relationship('QuestionAttempt', backref='quiz_attempt', lazy=True, cascade='all, delete-orphan')
     quiz_event_logs = db.relationship('QuizEventLog', backref='quiz_attempt', lazy=True, cascade='all, delete-orphan')
@@ -186,6 +198,9 @@ class QuestionAttempt(db.Model):
     question_id = db.Column(db.Integer, db.ForeignKey('questions.id', ondelete='SET NULL'), nullable=True, index=True)  # Allow NULL to preserve history
     selected_option = db.Column(db.String, nullable=False)
     question_attempt_timestamp = db.Column(db.DateTime, nullable=False, default=get_current_ist)
+    __table_args__ = (
+        db.UniqueConstraint('quiz_attempt_id', 'question_id', name='uq_question_attempt_answer'),
+    )
 
 # UserActivity Model (user-generated)
 class UserActivity(db.Model):
@@ -211,9 +226,30 @@ class QuizEventLog(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
-    quiz_attempt_id = db.Column(db.Integer, db.ForeignKey('quiz_attempts.id', ondelete='CASCADE'), nullable=False, index=True)
+    quiz_attempt_id = db.Column(db.Integer, db.ForeignKey('quiz_attempts.id', ondelete='CASCADE'), nullable=False)
     question_id = db.Column(db.Integer, db.ForeignKey('questions.id', ondelete='SET NULL'), nullable=True, index=True)  # Already nullable
     event_type = db.Column(db.String, nullable=False)
     event_timestamp = db.Column(db.DateTime, nullable=False, default=get_current_ist)
     event_details = db.Column(db.Text, nullable=True)
-    record_creation_timestamp = db.Column(db.DateTime, nullable=False, default=get_current_ist)
\ No newline at end of file
+    record_creation_timestamp = db.Column(db.DateTime, nullable=False, default=get_current_ist)
+
+    # Serves attempt timelines in chronological order (and every lookup by attempt)
+    __table_args__ = (
+        db.Index('ix_quiz_event_logs_attempt_timestamp', 'quiz_attempt_id', 'event_timestamp'),
+    )
+
+# QuestionDwellTime Model (derived from quiz_event_logs by the analytics job)
+class QuestionDwellTime(db.Model):
+    __tablename__ = 'question_dwell_times'
+
+    id = db.Column(db.Integer, primary_key=True)
+    quiz_attempt_id = db.Column(db.Integer, db.ForeignKey('quiz_attempts.id', ondelete='CASCADE'), nullable=False)
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quizzes.id', ondelete='SET NULL'), nullable=True, index=True)
+    question_id = db.Column(db.Integer, db.ForeignKey('questions.id', ondelete='SET NULL'), nullable=True, index=True)
+    dwell_seconds = db.Column(db.Float, nullable=False, default=0.0)
+    visits = db.Column(db.Integer, nullable=False, default=0)
+    record_creation_timestamp = db.Column(db.DateTime, default=get_current_ist)
+
+    __table_args__ = (
+        db.UniqueConstraint('quiz_attempt_id', 'question_id', name='uq_question_dwell_time'),
+    )
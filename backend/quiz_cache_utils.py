@@ -0,0 +1,137 @@
+# /quiz_cache_utils.py
+import json
+from model import db, Quiz, Question
+from setup_redis import redis_store
+
+PAPER_CACHE_TIMEOUT = 6 * 60 * 60  # 6 hours
+
+
+def _version_key(quiz_id):
+    return f"quiz:{quiz_id}:version"
+
+
+def _paper_key(quiz_id, version):
+    return f"quiz:{quiz_id}:paper:v{version}"
+
+
+def _answer_key_key(quiz_id, version):
+    return f"quiz:{quiz_id}:answers:v{version}"
+
+
+def _meta_key(quiz_id, version):
+    return f"quiz:{quiz_id}:meta:v{version}"
+
+
+def get_quiz_version(quiz_id):
+    """Return the current content version of a quiz (0 until the quiz is first edited)."""
+    version = redis_store.get(_version_key(quiz_id))
+    return int(version) if version else 0
+
+
+def bump_quiz_version(quiz_id):
+    """Invalidate every cached artefact of a quiz. Call only after the change is committed."""
+    return redis_store.incr(_version_key(quiz_id))
+
+
+def build_question_paper(quiz_id):
+    """Load the candidate-facing question list of a quiz, or None if the quiz does not exist."""
+    if db.session.get(Quiz, quiz_id) is None:
+        return None
+    rows = (
+        db.session.query(
+            Question.id, Question.question_statement,
+            Question.option1, Question.option2, Question.option3, Question.option4,
+            Question.difficulty, Question.score_value
+        )
+        .filter(Question.quiz_id == quiz_id)
+        .order_by(Question.id)
+        .all()
+    )
+    return [{
+        'id': row.id,
+        'question_statement': row.question_statement,
+        'options': [row.option1, row.option2, row.option3, row.option4],
+        'difficulty': row.difficulty,
+        'score_value': row.score_value
+    } for row in rows]
+
+
+def get_question_paper_bytes(quiz_id):
+    """Return the JSON-encoded question paper of a quiz, building and caching it on a miss."""
+    key = _paper_key(quiz_id, get_quiz_version(quiz_id))
+    payload = redis_store.get(key)
+    if payload is not None:
+        return payload
+
+    questions = build_question_paper(quiz_id)
+    if questions is None:
+        return None
+    payload = json.dumps(questions).encode('utf-8')
+    redis_store.set(key, payload, ex=PAPER_CACHE_TIMEOUT)
+    return payload
+
+
+def get_question_statements(quiz_id):
+    """Return {question_id: question_statement} for a quiz, read from the cached question paper."""
+    payload = get_question_paper_bytes(quiz_id)
+    if payload is None:
+        return {}
+    return {question['id']: question['question_statement'] for question in json.loads(payload)}
+
+
+def get_answer_key(quiz_id):
+    """Return {question_id: (correct_option, score_value, options)} for a quiz, cached per quiz version."""
+    key = _answer_key_key(quiz_id, get_quiz_version(quiz_id))
+    payload = redis_store.get(key)
+    if payload is None:
+        rows = (
+            db.session.query(
+                Question.id, Question.correct_option, Question.score_value,
+                Question.option1, Question.option2, Question.option3, Question.option4
+            )
+            .filter(Question.quiz_id == quiz_id)
+            .all()
+        )
+        answer_key = {
+            row.id: (row.correct_option, row.score_value, [row.option1, row.option2, row.option3, row.option4])
+            for row in rows
+        }
+        redis_store.set(key, json.dumps(answer_key), ex=PAPER_CACHE_TIMEOUT)
+        return answer_key
+    return {int(question_id): tuple(entry) for question_id, entry in json.loads(payload).items()}
+
+
+def build_quiz_meta(quiz_id):
+    """Load what attempt creation needs (date, duration, totals), or None if the quiz does not exist."""
+    quiz = db.session.get(Quiz, quiz_id)
+    if quiz is None:
+        return None
+    return {
+        'id': quiz.id,
+        'date_of_quiz': quiz.date_of_quiz.isoformat(),
+        'time_duration': quiz.time_duration,
+        'question_count': quiz.question_count,
+        'max_score': quiz.max_score
+    }
+
+
+def get_quiz_meta(quiz_id):
+    """Return the cached metadata of a quiz, building it on a miss; None if the quiz does not exist."""
+    key = _meta_key(quiz_id, get_quiz_version(quiz_id))
+    payload = redis_store.get(key)
+    if payload is not None:
+        return json.loads(payload)
+
+    quiz_meta = build_quiz_meta(quiz_id)
+    if quiz_meta is not None:
+        redis_store.set(key, json.dumps(quiz_meta), ex=PAPER_CACHE_TIMEOUT)
+    return quiz_meta
+
+
+def warm_quiz_cache(quiz_id):
+    """Materialize a quiz's metadata, question paper and answer key ahead of its opening rush."""
+    if get_quiz_meta(quiz_id) is None:
+        return False
+    get_question_paper_bytes(quiz_id)
+    get_answer_key(quiz_id)
+    return True
@@ -0,0 +1,30 @@
+# /quiz_totals_utils.py
+from sqlalchemy import func, select, update
+from model import db, Quiz, Question
+
+
+def adjust_quiz_totals(quiz_id, count_delta, score_delta):
+    """Shift a quiz's question_count and max_score in the caller's transaction."""
+    if not count_delta and not score_delta:
+        return
+    Quiz.query.filter_by(id=quiz_id).update({
+        Quiz.question_count: Quiz.question_count + count_delta,
+        Quiz.max_score: Quiz.max_score + score_delta
+    }, synchronize_session=False)
+
+
+def repair_quiz_totals(quiz_ids=None):
+    """Recompute question_count and max_score from the questions table; returns the number of quizzes updated."""
+    statement = update(Quiz).values(
+        question_count=select(func.count(Question.id))
+        .where(Question.quiz_id == Quiz.id)
+        .scalar_subquery(),
+        max_score=select(func.coalesce(func.sum(Question.score_value), 0))
+        .where(Question.quiz_id == Quiz.id)
+        .scalar_subquery()
+    )
+    if quiz_ids is not None:
+        statement = statement.where(Quiz.id.in_(quiz_ids))
+    result = db.session.execute(statement.execution_options(synchronize_session=False))
+    db.session.commit()
+    return result.rowcount
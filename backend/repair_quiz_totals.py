@@ -0,0 +1,19 @@
+# repair_quiz_totals.py
+# Backfills Quiz.question_count / Quiz.max_score, e.g. after adding the columns or editing questions by hand:
+#   python repair_quiz_totals.py            (every quiz)
+#   python repair_quiz_totals.py 12 15      (only these quiz ids)
+import sys
+from app import app
+from model import db, Quiz
+from quiz_totals_utils import repair_quiz_totals
+from quiz_cache_utils import bump_quiz_version
+
+with app.app_context():
+    quiz_ids = [int(quiz_id) for quiz_id in sys.argv[1:]] or None
+    updated = repair_quiz_totals(quiz_ids)
+    if quiz_ids is None:
+        quiz_ids = [quiz_id for (quiz_id,) in db.session.query(Quiz.id)]
+    # Cached quiz meta carries the totals, so every repaired quiz gets a new version
+    for quiz_id in quiz_ids:
+        bump_quiz_version(quiz_id)
+    print(f"Quiz totals repaired for {updated} quizzes.")
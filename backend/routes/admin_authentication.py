@@ -1,13 +1,13 @@
 # /routes/admin_authentication.py
-from datetime import timedelta
 from flask import Blueprint, request, jsonify,current_app
 from werkzeug.security import generate_password_hash, check_password_hash
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity,verify_jwt_in_request,decode_token,create_refresh_token
-from model import db, Admin, UserActivity 
+from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, get_jwt,get_jti,create_refresh_token
+from model import db, Admin
 from setup_cache import cache  
-from api_utils import get_system_info  
-from functools import wraps
-from setup_cache import cache
+from api_utils import capture_client_info
+from activity_log_utils import log_user_activity
+from login_throttle_utils import check_login_throttle, reset_login_throttle
+from token_revocation_utils import revoke_session_tokens
 import random
 import string
 
@@ -18,7 +18,11 @@ admin_auth_bp = Blueprint('admin_authentication', __name__)
 @jwt_required(refresh=True)
 def refresh():
     current_user = get_jwt_identity()
-    new_token = create_access_token(identity=current_user)
+    # Carry the identity claims over so refreshed tokens still resolve without a lookup
+    claims = get_jwt()
+    additional_claims = {key: claims[key] for key in ('role', 'username', 'id') if key in claims}
+    additional_claims['refresh_jti'] = claims['jti']  # Logout revokes this session's refresh token
+    new_token = create_access_token(identity=current_user, additional_claims=additional_claims)
     return jsonify(access_token=new_token), 200
 
 
@@ -40,37 +44,30 @@ def admin_login():
         if not email or not password:
             return jsonify({"msg": "Email and password are required."}), 400
 
+        # Reject bursts before paying for a password hash
+        client_info = capture_client_info(request)
+        client_ip = request.remote_addr or "unknown"
+        retry_after, login_attempt_id = check_login_throttle("admin", email, client_ip)
+        if retry_after:
+            return jsonify({"msg": f"Too many login attempts. Try again in {retry_after} seconds."}), 429, {"Retry-After": str(retry_after)}
+
         admin = Admin.query.filter_by(email=email).first()
         if not admin or not check_password_hash(admin.password, password):
             return jsonify({"msg": "Invalid email or password."}), 401
+        reset_login_throttle("admin", email, client_ip, login_attempt_id)
 
         identity = admin.email  # String sub
         additional_claims = {"role": "admin", "username": admin.username,'id':admin.id}
-        access_token = create_access_token(identity=identity, additional_claims=additional_claims)
         refresh_token = create_refresh_token(identity=identity, additional_claims=additional_claims)
+        # The access token names its session's refresh token so logout can revoke exactly that one
+        access_token = create_access_token(identity=identity, additional_claims=dict(additional_claims, refresh_jti=get_jti(refresh_token)))
         JWT_ACCESS_TOKEN_EXPIRES = current_app.config["JWT_ACCESS_TOKEN_EXPIRES"]
         JWT_REFRESH_TOKEN_EXPIRES = current_app.config["JWT_REFRESH_TOKEN_EXPIRES"]
         cache.set(f"admin_{admin.id}_access", access_token, timeout=JWT_ACCESS_TOKEN_EXPIRES)
         cache.set(f"admin_{admin.id}_refresh", refresh_token, timeout=JWT_REFRESH_TOKEN_EXPIRES)
         try:
-            system_info = get_system_info(request)
-            new_activity = UserActivity(
-                user_id=admin.id,
-                user_role="admin",
-                activity_type="login",
-                client_ip=system_info.get("client_ip", "Unknown"),
-                mac_address=",".join(system_info.get("mac_addresses", [])),
-                os_info=system_info.get("os_info", "Unknown"),
-                browser=system_info.get("browser", "Unknown"),
-                device=system_info.get("device", "Unknown"),
-                user_agent=system_info.get("user_agent", "Unknown"),
-                memory_gb=system_info.get("memory_gb", 0),
-                cpu_cores=system_info.get("cpu_cores", 0)
-            )
-            db.session.add(new_activity)
-            db.session.commit()
+            log_user_activity(dict(client_info, user_id=admin.id, user_role="admin", activity_type="login"))
         except Exception as e:
-            db.session.rollback()
             print(f"Error logging admin activity (login): {e}")
         return jsonify({"msg": "Admin login successful.", "access_token": access_token,"refresh_token":refresh_token,"role": "admin" }), 200
 
@@ -87,25 +84,10 @@ def admin_logout():
         admin = Admin.query.filter_by(email=admin_identity).first()  
         if admin:
             cache.delete(f"admin_{admin.id}_access")
+            revoke_session_tokens()
             try:
-                system_info = get_system_info(request)
-                new_activity = UserActivity(
-                    user_id=admin.id,
-                    user_role="admin",  
-                    activity_type="logout",
-                    client_ip=system_info.get("client_ip", "Unknown"),
-                    mac_address=",".join(system_info.get("mac_addresses", [])),
-                    os_info=system_info.get("os_info", "Unknown"),
-                    browser=system_info.get("browser", "Unknown"),
-                    device=system_info.get("device", "Unknown"),
-                    user_agent=system_info.get("user_agent", "Unknown"),
-                    memory_gb=system_info.get("memory_gb", 0),
-                    cpu_cores=system_info.get("cpu_cores", 0)
-                )
-                db.session.add(new_activity)
-                db.session.commit()
+                log_user_activity(dict(capture_client_info(request), user_id=admin.id, user_role="admin", activity_type="logout"))
             except Exception as e:
-                db.session.rollback()
                 print(f"Error logging admin activity (logout): {e}")
         return jsonify({"msg": "Admin logged out successfully."}), 200
     except Exception as e:
@@ -151,24 +133,8 @@ def admin_forgot_password():
         cache.set(cache_key, cache_data, timeout=15 * 60)  # 15 minutes in seconds
         # Log the password reset request activity
         try:
-            system_info = get_system_info(request)
-            new_activity = UserActivity(
-                user_id=admin.id,
-                user_role="admin",
-                activity_type="forgot_password",
-                client_ip=system_info.get("client_ip", "Unknown"),
-                mac_address=",".join(system_info.get("mac_addresses", [])),
-                os_info=system_info.get("os_info", "Unknown"),
-                browser=system_info.get("browser", "Unknown"),
-                device=system_info.get("device", "Unknown"),
-                user_agent=system_info.get("user_agent", "Unknown"),
-                memory_gb=system_info.get("memory_gb", 0),
-                cpu_cores=system_info.get("cpu_cores", 0)
-            )
-            db.session.add(new_activity)
-            db.session.commit()
+            log_user_activity(dict(capture_client_info(request), user_id=admin.id, user_role="admin", activity_type="forgot_password"))
         except Exception as e:
-            db.session.rollback()
             print(f"Error logging password recovery activity: {e}")
 
         # If the admin has an email, send the OTP via email using Celery
@@ -215,24 +181,8 @@ def admin_reset_password():
 
         # Log the password reset activity
         try:
-            system_info = get_system_info(request)
-            new_activity = UserActivity(
-                user_id=admin.id,
-                user_role="admin",
-                activity_type="reset_password",
-                client_ip=system_info.get("client_ip", "Unknown"),
-                mac_address=",".join(system_info.get("mac_addresses", [])),
-                os_info=system_info.get("os_info", "Unknown"),
-                browser=system_info.get("browser", "Unknown"),
-                device=system_info.get("device", "Unknown"),
-                user_agent=system_info.get("user_agent", "Unknown"),
-                memory_gb=system_info.get("memory_gb", 0),
-                cpu_cores=system_info.get("cpu_cores", 0)
-            )
-            db.session.add(new_activity)
-            db.session.commit()
+            log_user_activity(dict(capture_client_info(request), user_id=admin.id, user_role="admin", activity_type="reset_password"))
         except Exception as e:
-            db.session.rollback()
             print(f"Error logging password reset activity: {e}")
         if admin.email:
             from celery_tasks import send_reset_password_success_email
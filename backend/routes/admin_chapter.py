@@ -1,8 +1,9 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required
 from api_utils import admin_required
-from model import db, Chapter
-from api_utils import get_current_user, get_current_ist
+from model import db, Chapter, Quiz
+from api_utils import get_current_principal, get_current_ist
+from quiz_cache_utils import bump_quiz_version
 
 admin_chapter_bp = Blueprint('admin_chapter', __name__)
 
@@ -34,7 +35,7 @@ def create_chapter(subject_id):
     """Create a new chapter under a subject."""
     try:
         data = request.get_json()
-        admin = get_current_user()
+        admin = get_current_principal()
         chapter = Chapter(
             subject_id=subject_id,
             admin_id=admin.id,
@@ -101,8 +102,12 @@ def update_chapter(chapter_id):
 def delete_chapter(chapter_id):
     try:
         chapter = Chapter.query.get_or_404(chapter_id)
+        quiz_ids = [quiz_id for (quiz_id,) in db.session.query(Quiz.id).filter(Quiz.chapter_id == chapter_id)]
         db.session.delete(chapter)
         db.session.commit()
+        # The chapter's quizzes went with it: drop their cached papers and meta
+        for quiz_id in quiz_ids:
+            bump_quiz_version(quiz_id)
         return jsonify({"msg": "Chapter deleted successfully"}), 200
     except Exception as e:
         db.session.rollback()
@@ -0,0 +1,90 @@
+from flask import Blueprint, jsonify, request, current_app, stream_with_context
+from flask_jwt_extended import jwt_required
+from api_utils import admin_required
+from model import db, QuizAttempt, QuizEventLog
+from quiz_cache_utils import get_question_statements
+from live_monitor_utils import get_live_quiz_stats
+from sqlalchemy import select
+import json
+
+admin_exam_monitor_bp = Blueprint('admin_exam_monitor', __name__)
+
+TIMELINE_FETCH_SIZE = 500  # rows pulled per round trip from the server-side cursor
+
+
+def stream_attempt_timeline(quiz_attempt):
+    """Yield an attempt's event log as NDJSON lines, oldest first, without loading it into memory."""
+    yield json.dumps({
+        'type': 'attempt',
+        'attempt_id': quiz_attempt.id,
+        'quiz_id': quiz_attempt.quiz_id,
+        'user_id': quiz_attempt.user_id,
+        'quiz_start_time': quiz_attempt.quiz_start_time.isoformat() if quiz_attempt.quiz_start_time else None,
+        'quiz_end_time': quiz_attempt.quiz_end_time.isoformat() if quiz_attempt.quiz_end_time else None
+    }) + '\n'
+
+    # Statements are only fetched (from the cached question paper) once a question shows up
+    question_statements = None
+    rows = db.session.execute(
+        select(
+            QuizEventLog.id, QuizEventLog.question_id, QuizEventLog.event_type,
+            QuizEventLog.event_timestamp, QuizEventLog.event_details
+        )
+        .where(QuizEventLog.quiz_attempt_id == quiz_attempt.id)
+        .order_by(QuizEventLog.event_timestamp, QuizEventLog.id)
+        .execution_options(yield_per=TIMELINE_FETCH_SIZE)
+    )
+    event_count = 0
+    try:
+        for row in rows:
+            if row.question_id is not None and question_statements is None:
+                question_statements = get_question_statements(quiz_attempt.quiz_id) if quiz_attempt.quiz_id else {}
+            event_count += 1
+            yield json.dumps({
+                'type': 'event',
+                'id': row.id,
+                'event_type': row.event_type,
+                'event_timestamp': row.event_timestamp.isoformat(),
+                'question_id': row.question_id,
+                'question_statement': question_statements.get(row.question_id) if row.question_id is not None else None,
+                'event_details': row.event_details
+            }) + '\n'
+    finally:
+        rows.close()
+    yield json.dumps({'type': 'end', 'event_count': event_count}) + '\n'
+
+
+# Route to replay an attempt's timeline for review
+@admin_exam_monitor_bp.route('/dashboard/admin/quiz_attempt/<int:attempt_id>/timeline', methods=['GET'])
+@jwt_required()
+@admin_required()
+def get_attempt_timeline(attempt_id):
+    try:
+        quiz_attempt = db.session.get(QuizAttempt, attempt_id)
+        if not quiz_attempt:
+            return jsonify({'msg': 'Quiz attempt not found'}), 404
+
+        return current_app.response_class(
+            stream_with_context(stream_attempt_timeline(quiz_attempt)),
+            mimetype='application/x-ndjson',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+
+    except Exception as e:
+        return jsonify({'msg': f'Error streaming attempt timeline: {str(e)}'}), 500
+
+# Route to watch running exams: active attempts and recent submissions/tab warnings per quiz
+@admin_exam_monitor_bp.route('/dashboard/admin/live_exams', methods=['GET'])
+@jwt_required()
+@admin_required()
+def get_live_exams():
+    try:
+        window_minutes = request.args.get('window', default=5, type=int)
+        quizzes = get_live_quiz_stats(window_minutes)
+        return jsonify({
+            'total_active_attempts': sum(quiz['active_attempts'] for quiz in quizzes),
+            'quizzes': quizzes
+        }), 200
+
+    except Exception as e:
+        return jsonify({'msg': f'Error fetching live exams: {str(e)}'}), 500
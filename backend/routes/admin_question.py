@@ -1,8 +1,11 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required
 from api_utils import admin_required
-from model import db, Question
-from api_utils import get_current_user
+from model import db, Question, score_value_for
+from api_utils import get_current_principal
+from quiz_cache_utils import bump_quiz_version
+from quiz_totals_utils import adjust_quiz_totals
+from grading_utils import shift_attempt_max_scores
 
 admin_question_bp = Blueprint('admin_question', __name__)
 
@@ -38,7 +41,7 @@ def get_questions(quiz_id):
 def create_question(quiz_id):
     try:
         data = request.get_json()
-        admin = get_current_user()
+        admin = get_current_principal()
         
 
         required_fields = ['question_statement', 'option1', 'option2', 'option3', 'option4', 'correct_option']
@@ -58,7 +61,9 @@ def create_question(quiz_id):
             difficulty=data.get('difficulty', 'easy')
         )
         db.session.add(question)
+        adjust_quiz_totals(quiz_id, 1, question.score_value)
         db.session.commit()
+        bump_quiz_version(quiz_id)
         
         question_data = {
             'id': question.id,
@@ -112,10 +117,25 @@ def update_question(question_id):
         question.option2 = data.get('option2', question.option2)
         question.option3 = data.get('option3', question.option3)
         question.option4 = data.get('option4', question.option4)
+        previous_correct_option = question.correct_option
+        previous_score_value = question.score_value
         question.correct_option = data.get('correct_option', question.correct_option)
         question.difficulty = data.get('difficulty', question.difficulty)
+        question.score_value = score_value_for(question.difficulty)
+
+        # Keep the quiz and attempt maxima in step with the question's new score value
+        score_delta = question.score_value - previous_score_value
+        adjust_quiz_totals(question.quiz_id, 0, score_delta)
+        shift_attempt_max_scores(question.quiz_id, score_delta)
         
         db.session.commit()
+        bump_quiz_version(question.quiz_id)
+
+        # A changed answer key invalidates the stored results of every attempt of the quiz
+        regrade_task_id = None
+        if question.correct_option != previous_correct_option or score_delta:
+            from celery_tasks import regrade_quiz_attempts
+            regrade_task_id = regrade_quiz_attempts.delay(question.quiz_id).id
         
         question_data = {
             'id': question.id,
@@ -127,21 +147,41 @@ def update_question(question_id):
             'option3': question.option3,
             'option4': question.option4,
             'correct_option': question.correct_option,
-            'difficulty': question.difficulty
+            'difficulty': question.difficulty,
+            'regrade_task_id': regrade_task_id
         }
         return jsonify(question_data), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": f"Failed to update question: {str(e)}"}), 500
 
+@admin_question_bp.route('/questions/regrade/<task_id>', methods=['GET'])
+@jwt_required()
+@admin_required()
+def get_regrade_status(task_id):
+    try:
+        from celery_tasks import regrade_quiz_attempts
+        result = regrade_quiz_attempts.AsyncResult(task_id)
+        status = {'task_id': task_id, 'state': result.state}
+        if result.state in ('PROGRESS', 'SUCCESS'):
+            status.update(result.info or {})
+        elif result.state == 'FAILURE':
+            status['error'] = str(result.info)
+        return jsonify(status), 200
+    except Exception as e:
+        return jsonify({"error": f"Failed to fetch regrade status: {str(e)}"}), 500
+
 @admin_question_bp.route('/questions/<int:question_id>', methods=['DELETE'])
 @jwt_required()
 @admin_required()
 def delete_question(question_id):
     try:
         question = Question.query.get_or_404(question_id)
+        quiz_id = question.quiz_id
+        adjust_quiz_totals(quiz_id, -1, -question.score_value)
         db.session.delete(question)
         db.session.commit()
+        bump_quiz_version(quiz_id)
         return jsonify({"msg": "Question deleted successfully"}), 200
     except Exception as e:
         db.session.rollback()
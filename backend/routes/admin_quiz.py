@@ -2,7 +2,8 @@ from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required
 from api_utils import admin_required
 from model import db, Subject, Chapter, Quiz, Question
-from api_utils import get_current_user
+from api_utils import get_current_principal
+from quiz_cache_utils import bump_quiz_version
 from datetime import datetime
 
 
@@ -38,7 +39,7 @@ def get_quizzes(chapter_id):
 def create_quiz(chapter_id):
     try:
         data = request.get_json()
-        admin = get_current_user()
+        admin = get_current_principal()
 
         date_of_quiz_str = data.get('date_of_quiz')
         date_of_quiz = None
@@ -127,6 +128,7 @@ def update_quiz(quiz_id):
         if 'pay_amount' in data:
             quiz.pay_amount = float(data['pay_amount']) if data['pay_amount'] else 0.0
         db.session.commit()
+        bump_quiz_version(quiz_id)
         
         quiz_data = {
             'id': quiz.id,
@@ -183,6 +185,7 @@ def delete_quiz(quiz_id):
         quiz = Quiz.query.get_or_404(quiz_id)
         db.session.delete(quiz)
         db.session.commit()
+        bump_quiz_version(quiz_id)
         return jsonify({"msg": "Quiz deleted successfully"}), 200
     except Exception as e:
         db.session.rollback()
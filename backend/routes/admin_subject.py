@@ -1,8 +1,9 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required
 from api_utils import admin_required
-from model import db, Subject
-from api_utils import get_current_user, get_current_ist
+from model import db, Subject, Chapter, Quiz
+from api_utils import get_current_principal, get_current_ist
+from quiz_cache_utils import bump_quiz_version
 
 admin_subject_bp = Blueprint('admin_subject', __name__)
 
@@ -32,7 +33,7 @@ def get_all_subjects():
 def create_subject():
     try:
         data = request.get_json()
-        admin = get_current_user()
+        admin = get_current_principal()
         subject = Subject(
             name=data.get('name'),
             description=data.get('description'),
@@ -94,8 +95,12 @@ def update_subject(subject_id):
 def delete_subject(subject_id):
     try:
         subject = Subject.query.get_or_404(subject_id)
+        quiz_ids = [quiz_id for (quiz_id,) in db.session.query(Quiz.id).join(Chapter).filter(Chapter.subject_id == subject_id)]
         db.session.delete(subject)
         db.session.commit()
+        # The subject's quizzes went with it: drop their cached papers and meta
+        for quiz_id in quiz_ids:
+            bump_quiz_version(quiz_id)
         return jsonify({"msg": "Subject deleted successfully"}), 200
     except Exception as e:
         db.session.rollback()
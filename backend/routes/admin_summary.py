@@ -1,7 +1,9 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from api_utils import admin_required, get_current_ist, get_current_user
-from model import db, Subject, Chapter, Quiz, Question, Admin, User, QuizAttempt, QuizPayment, QuizCart
+from api_utils import admin_required, get_current_ist, get_current_principal
+from model import db, Subject, Chapter, Quiz, Question, Admin, User, QuizAttempt, QuizPayment, QuizCart, QuestionAttempt, QuestionDwellTime
+from sqlalchemy import func, case
+from login_throttle_utils import get_login_throttle_stats
 from datetime import datetime
 import pytz
 
@@ -13,7 +15,7 @@ admin_summary_bp = Blueprint('admin_summary', __name__)
 @admin_required()
 def get_admin_summary():
     try:
-        current_user = get_current_user()
+        current_user = get_current_principal()
 
         current_admin_id = current_user.id if current_user else None        
         # 1. Overall System Stats
@@ -128,7 +130,7 @@ def get_admin_summary():
 @admin_required()
 def trigger_all_users_quiz_data_export():
     try:
-        current_admin = get_current_user()
+        current_admin = get_current_principal()
         if not current_admin:
             return jsonify({'msg': 'Admin not found'}), 404
 
@@ -140,4 +142,93 @@ def trigger_all_users_quiz_data_export():
         }), 202
 
     except Exception as e:
-        return jsonify({'msg': f'Error triggering export: {str(e)}'}), 500
\ No newline at end of file
+        return jsonify({'msg': f'Error triggering export: {str(e)}'}), 500
+
+# Route to get per-question time and difficulty analytics of a quiz
+@admin_summary_bp.route('/dashboard/admin/quiz/<int:quiz_id>/question_analytics', methods=['GET'])
+@jwt_required()
+@admin_required()
+def get_quiz_question_analytics(quiz_id):
+    try:
+        quiz = db.session.get(Quiz, quiz_id)
+        if not quiz:
+            return jsonify({'msg': 'Quiz not found'}), 404
+
+        dwell_times = {
+            row.question_id: row for row in db.session.query(
+                QuestionDwellTime.question_id,
+                func.count(QuestionDwellTime.id).label('candidates'),
+                func.avg(QuestionDwellTime.dwell_seconds).label('avg_dwell_seconds'),
+                func.max(QuestionDwellTime.dwell_seconds).label('max_dwell_seconds'),
+                func.avg(QuestionDwellTime.visits).label('avg_visits')
+            )
+            .filter(QuestionDwellTime.quiz_id == quiz_id)
+            .group_by(QuestionDwellTime.question_id)
+        }
+        answers = {
+            row.question_id: row for row in db.session.query(
+                QuestionAttempt.question_id,
+                func.count(QuestionAttempt.id).label('answered'),
+                func.sum(case((QuestionAttempt.selected_option == Question.correct_option, 1), else_=0)).label('correct')
+            )
+            .join(Question, Question.id == QuestionAttempt.question_id)
+            .filter(Question.quiz_id == quiz_id)
+            .group_by(QuestionAttempt.question_id)
+        }
+
+        questions = []
+        for question in Question.query.filter_by(quiz_id=quiz_id).order_by(Question.id):
+            dwell = dwell_times.get(question.id)
+            answer = answers.get(question.id)
+            answered = answer.answered if answer else 0
+            questions.append({
+                'question_id': question.id,
+                'question_statement': question.question_statement,
+                'difficulty': question.difficulty,
+                'candidates': dwell.candidates if dwell else 0,
+                'avg_dwell_seconds': round(float(dwell.avg_dwell_seconds), 2) if dwell else None,
+                'max_dwell_seconds': round(float(dwell.max_dwell_seconds), 2) if dwell else None,
+                'avg_visits': round(float(dwell.avg_visits), 2) if dwell else None,
+                'answered': answered,
+                'correct_rate': round(100.0 * (answer.correct or 0) / answered, 2) if answered else None
+            })
+
+        return jsonify({'quiz_id': quiz_id, 'questions': questions}), 200
+
+    except Exception as e:
+        return jsonify({'msg': f'Error fetching question analytics: {str(e)}'}), 500
+
+# Route to get the per-question time spent in a quiz attempt
+@admin_summary_bp.route('/dashboard/admin/quiz_attempt/<int:attempt_id>/dwell_times', methods=['GET'])
+@jwt_required()
+@admin_required()
+def get_attempt_dwell_times(attempt_id):
+    try:
+        quiz_attempt = db.session.get(QuizAttempt, attempt_id)
+        if not quiz_attempt:
+            return jsonify({'msg': 'Quiz attempt not found'}), 404
+
+        dwell_times = QuestionDwellTime.query.filter_by(quiz_attempt_id=attempt_id).order_by(QuestionDwellTime.question_id).all()
+        return jsonify({
+            'attempt_id': attempt_id,
+            'quiz_id': quiz_attempt.quiz_id,
+            'processed': quiz_attempt.analytics_processed,
+            'questions': [{
+                'question_id': dwell.question_id,
+                'dwell_seconds': dwell.dwell_seconds,
+                'visits': dwell.visits
+            } for dwell in dwell_times]
+        }), 200
+
+    except Exception as e:
+        return jsonify({'msg': f'Error fetching attempt dwell times: {str(e)}'}), 500
+
+# Route to see how many login attempts the throttle rejected before hashing
+@admin_summary_bp.route('/dashboard/admin/login_throttle', methods=['GET'])
+@jwt_required()
+@admin_required()
+def get_login_throttle():
+    try:
+        return jsonify(get_login_throttle_stats()), 200
+    except Exception as e:
+        return jsonify({'msg': f'Error fetching login throttle stats: {str(e)}'}), 500
@@ -1,13 +1,13 @@
 # /routes/auth.py
-from datetime import timedelta
 from flask import Blueprint, request, jsonify,current_app
 from werkzeug.security import generate_password_hash, check_password_hash
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity,verify_jwt_in_request,decode_token,create_refresh_token
-from model import db, User, Admin, UserActivity 
+from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, get_jwt,get_jti,create_refresh_token
+from model import db, User
 from setup_cache import cache  
-from api_utils import get_system_info  
-from functools import wraps
-from setup_cache import cache
+from api_utils import capture_client_info
+from activity_log_utils import log_user_activity
+from login_throttle_utils import check_login_throttle, reset_login_throttle
+from token_revocation_utils import revoke_session_tokens
 import random
 import string
 
@@ -19,7 +19,11 @@ user_auth_bp = Blueprint('user_authentication', __name__)
 @jwt_required(refresh=True)
 def refresh():
     current_user = get_jwt_identity()
-    new_token = create_access_token(identity=current_user)
+    # Carry the identity claims over so refreshed tokens still resolve without a lookup
+    claims = get_jwt()
+    additional_claims = {key: claims[key] for key in ('role', 'username', 'id') if key in claims}
+    additional_claims['refresh_jti'] = claims['jti']  # Logout revokes this session's refresh token
+    new_token = create_access_token(identity=current_user, additional_claims=additional_claims)
     return jsonify(access_token=new_token), 200
 
 # Route for user signup
@@ -76,15 +80,24 @@ def user_login():
         if not email or not password:
             return jsonify({"msg": "Email and password are required."}), 400
 
+        # Reject bursts before paying for a password hash
+        client_info = capture_client_info(request)
+        client_ip = request.remote_addr or "unknown"
+        retry_after, login_attempt_id = check_login_throttle("user", email, client_ip)
+        if retry_after:
+            return jsonify({"msg": f"Too many login attempts. Try again in {retry_after} seconds."}), 429, {"Retry-After": str(retry_after)}
+
         user = User.query.filter_by(email=email).first()
         # print(user)
         if not user or not check_password_hash(user.password, password):
             return jsonify({"msg": "Invalid email or password."}), 401
+        reset_login_throttle("user", email, client_ip, login_attempt_id)
 
         identity = user.email  
         additional_claims = {"role": "user", "username": user.username,'id':user.id}
-        access_token = create_access_token(identity=identity, additional_claims=additional_claims)
         refresh_token = create_refresh_token(identity=identity, additional_claims=additional_claims)
+        # The access token names its session's refresh token so logout can revoke exactly that one
+        access_token = create_access_token(identity=identity, additional_claims=dict(additional_claims, refresh_jti=get_jti(refresh_token)))
         JWT_ACCESS_TOKEN_EXPIRES = current_app.config["JWT_ACCESS_TOKEN_EXPIRES"]
         JWT_REFRESH_TOKEN_EXPIRES = current_app.config["JWT_REFRESH_TOKEN_EXPIRES"]
         cache.set(f"user_{user.id}_access", access_token, timeout=JWT_ACCESS_TOKEN_EXPIRES)
@@ -92,24 +105,8 @@ def user_login():
         
         # Log user login activity
         try:
-            system_info = get_system_info(request)
-            new_activity = UserActivity(
-                user_id=user.id,
-                user_role="user",
-                activity_type="login",
-                client_ip=system_info.get("client_ip", "Unknown"),
-                mac_address=",".join(system_info.get("mac_addresses", [])),
-                os_info=system_info.get("os_info", "Unknown"),
-                browser=system_info.get("browser", "Unknown"),
-                device=system_info.get("device", "Unknown"),
-                user_agent=system_info.get("user_agent", "Unknown"),
-                memory_gb=system_info.get("memory_gb", 0),
-                cpu_cores=system_info.get("cpu_cores", 0)
-            )
-            db.session.add(new_activity)
-            db.session.commit()
+            log_user_activity(dict(client_info, user_id=user.id, user_role="user", activity_type="login"))
         except Exception as e:
-            db.session.rollback()
             print(f"Error logging user activity (login): {e}")
 
         return jsonify({"msg": "Login successful.", "access_token": access_token,"refresh_token":refresh_token, "role": "user" }), 200
@@ -127,26 +124,11 @@ def user_logout():
         user = User.query.filter_by(email=user_identity).first()
         if user:
             cache.delete(f"user_{user.id}_access")
+            revoke_session_tokens()
             # Log user logout activity
             try:
-                system_info = get_system_info(request)
-                new_activity = UserActivity(
-                    user_id=user.id,
-                    user_role="user",
-                    activity_type="logout",
-                    client_ip=system_info.get("client_ip", "Unknown"),
-                    mac_address=",".join(system_info.get("mac_addresses", [])),
-                    os_info=system_info.get("os_info", "Unknown"),
-                    browser=system_info.get("browser", "Unknown"),
-                    device=system_info.get("device", "Unknown"),
-                    user_agent=system_info.get("user_agent", "Unknown"),
-                    memory_gb=system_info.get("memory_gb", 0),
-                    cpu_cores=system_info.get("cpu_cores", 0)
-                )
-                db.session.add(new_activity)
-                db.session.commit()
+                log_user_activity(dict(capture_client_info(request), user_id=user.id, user_role="user", activity_type="logout"))
             except Exception as e:
-                db.session.rollback()
                 print(f"Error logging user activity (logout): {e}")
         return jsonify({"msg": "User logged out successfully."}), 200
     except Exception as e:
@@ -197,24 +179,8 @@ def user_forgot_password_user():
         cache.set(cache_key, cache_data, timeout=15 * 60)
         # Log the password reset request activity
         try:
-            system_info = get_system_info(request)
-            new_activity = UserActivity(
-                user_id=user.id,
-                user_role="user",
-                activity_type="forgot_password",
-                client_ip=system_info.get("client_ip", "Unknown"),
-                mac_address=",".join(system_info.get("mac_addresses", [])),
-                os_info=system_info.get("os_info", "Unknown"),
-                browser=system_info.get("browser", "Unknown"),
-                device=system_info.get("device", "Unknown"),
-                user_agent=system_info.get("user_agent", "Unknown"),
-                memory_gb=system_info.get("memory_gb", 0),
-                cpu_cores=system_info.get("cpu_cores", 0)
-            )
-            db.session.add(new_activity)
-            db.session.commit()
+            log_user_activity(dict(capture_client_info(request), user_id=user.id, user_role="user", activity_type="forgot_password"))
         except Exception as e:
-            db.session.rollback()
             print(f"Error logging password recovery activity: {e}")
 
         # If the user has an email, send the OTP via email using Celery
@@ -259,24 +225,8 @@ def user_reset_password_user():
 
         # Log the password reset activity
         try:
-            system_info = get_system_info(request)
-            new_activity = UserActivity(
-                user_id=user.id,
-                user_role="user",
-                activity_type="reset_password",
-                client_ip=system_info.get("client_ip", "Unknown"),
-                mac_address=",".join(system_info.get("mac_addresses", [])),
-                os_info=system_info.get("os_info", "Unknown"),
-                browser=system_info.get("browser", "Unknown"),
-                device=system_info.get("device", "Unknown"),
-                user_agent=system_info.get("user_agent", "Unknown"),
-                memory_gb=system_info.get("memory_gb", 0),  
-                cpu_cores=system_info.get("cpu_cores", 0)
-            )
-            db.session.add(new_activity)
-            db.session.commit()
+            log_user_activity(dict(capture_client_info(request), user_id=user.id, user_role="user", activity_type="reset_password"))
         except Exception as e:
-            db.session.rollback()
             print(f"Error logging password reset activity: {e}")
          
         if user.email:   
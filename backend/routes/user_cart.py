@@ -6,7 +6,7 @@ import uuid
 import stripe
 import os
 from model import db, Quiz, QuizAttempt, QuizPayment, QuizCart
-from api_utils import user_required, get_current_user, get_current_ist
+from api_utils import user_required, get_current_principal, get_current_ist
 import hashlib
 from datetime import datetime
 from dotenv import load_dotenv
@@ -25,7 +25,7 @@ stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
 @jwt_required()
 @user_required()
 def add_to_cart(quiz_id):
-    current_user = get_current_user()
+    current_user = get_current_principal()
     quiz = Quiz.query.get_or_404(quiz_id)
     
     if not quiz.pay_required:
@@ -48,7 +48,7 @@ def add_to_cart(quiz_id):
 @jwt_required()
 @user_required()
 def get_cart():
-    current_user = get_current_user()
+    current_user = get_current_principal()
     cart_items = QuizCart.query.filter_by(user_id=current_user.id).all()
     STRIPE_PUBLIC_KEY = current_app.config["STRIPE_PUBLIC_KEY"]
     cart_data = []
@@ -79,7 +79,7 @@ def get_cart():
 @jwt_required()
 @user_required()
 def remove_from_cart(cart_id):
-    current_user = get_current_user()
+    current_user = get_current_principal()
     cart_item = QuizCart.query.filter_by(id=cart_id, user_id=current_user.id).first_or_404()
     
     db.session.delete(cart_item)
@@ -1,7 +1,7 @@
 from flask import Blueprint, jsonify, request, current_app
 from flask_jwt_extended import jwt_required, get_jwt
 from model import db, Quiz, QuizPayment, QuizCart
-from api_utils import user_required, get_current_user, get_current_ist
+from api_utils import user_required, get_current_principal, get_current_ist
 from datetime import datetime
 
 user_dashboard_bp = Blueprint('user_dashboard', __name__)
@@ -20,7 +20,7 @@ def user_dashboard():
 @jwt_required()
 @user_required()
 def get_user_quizzes():
-    current_user = get_current_user()
+    current_user = get_current_principal()
     current_date = get_current_ist()
     
     quizzes = Quiz.query.filter_by(visibility=True).all()
@@ -33,7 +33,7 @@ def get_user_quizzes():
             'quiz_id': quiz.id,
             'chapter': quiz.chapter.name,
             'subject': quiz.chapter.subject.name,
-            'number_of_questions': len(quiz.questions),
+            'number_of_questions': quiz.question_count,
             'date': quiz.date_of_quiz.strftime('%Y-%m-%d'),
             'duration': f"{quiz.time_duration // 60:02d}:{quiz.time_duration % 60:02d}",
             'overall_difficulty': str(quiz.overall_difficulty),
@@ -62,7 +62,7 @@ def get_quiz_metadata(quiz_id):
         'quiz_id': quiz.id,
         'subject': quiz.chapter.subject.name,
         'chapter': quiz.chapter.name,
-        'number_of_questions': len(quiz.questions),
+        'number_of_questions': quiz.question_count,
         'date': quiz.date_of_quiz.strftime('%Y-%m-%d'),
         'overall_difficulty': str(quiz.overall_difficulty),
         'pay_required': quiz.pay_required,
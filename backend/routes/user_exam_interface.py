@@ -1,22 +1,153 @@
 from flask import Blueprint, jsonify, request, current_app
 from flask_jwt_extended import jwt_required
-from model import db,Quiz, Question, QuizAttempt, QuestionAttempt, QuizEventLog
-from api_utils import user_required, get_current_user, get_current_ist
+from model import db, QuizAttempt, QuestionAttempt
+from api_utils import user_required, get_current_principal, get_current_ist
+from grading_utils import finalize_quiz_attempt, answer_delta, lock_open_attempt, apply_attempt_counters
+from quiz_cache_utils import get_question_paper_bytes, get_answer_key, get_quiz_meta
+from event_log_utils import log_quiz_event, log_quiz_events
+from exam_session_utils import (
+    create_exam_session, load_exam_session, end_exam_session, set_review_marks, incr_tab_switch_count,
+    publish_exam_event, stream_exam_session, record_answer_events, get_attempt_state
+)
+from shuffle_utils import personalize_paper, canonical_option, option_permutation
+from live_monitor_utils import record_attempt_started, record_attempts_finished, record_tab_warning
+from collections import Counter
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from datetime import datetime, date, timedelta
 import hashlib
+import json
+import secrets
+import pytz
 
 user_exam_interface_bp = Blueprint('user_exam_interface', __name__)
 
+IST = pytz.timezone("Asia/Kolkata")
+SYNC_ACTIONS = ('save', 'clear', 'delete', 'navigate', 'mark_for_review')
+MAX_SYNC_BATCH_SIZE = 200
+MAX_TAB_SWITCH_WARNINGS = 3
+
 
 def validate_exam_access_token(quiz_attempt_id, access_token):
-    """Validate quiz attempt access token"""
+    """Validate quiz attempt access token against the Redis exam session; returns the session or None"""
     try:
-        quiz_attempt = QuizAttempt.query.get(quiz_attempt_id)
-        return (quiz_attempt and 
-                quiz_attempt.access_token == access_token and 
-                not quiz_attempt.quiz_end_time)
+        exam_session = load_exam_session(quiz_attempt_id)
+        if (exam_session and 
+                exam_session['access_token'] == access_token and 
+                not exam_session['ended']):
+            return exam_session
+        return None
     except Exception as e:
         print(f"Error validating access token: {str(e)}")
-        return False
+        return None
+
+def upsert_question_attempt(quiz_attempt_id, user_id, question_id, selected_option, event_time):
+    """Keep exactly one answer row per (attempt, question), overwriting the previous answer"""
+    values = {
+        'quiz_attempt_id': quiz_attempt_id,
+        'user_id': user_id,
+        'question_id': question_id,
+        'selected_option': selected_option,
+        'question_attempt_timestamp': event_time
+    }
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        insert_stmt = (postgresql_insert if dialect == 'postgresql' else sqlite_insert)(QuestionAttempt).values(**values)
+        db.session.execute(insert_stmt.on_conflict_do_update(
+            index_elements=['quiz_attempt_id', 'question_id'],
+            set_={
+                'selected_option': insert_stmt.excluded.selected_option,
+                'question_attempt_timestamp': insert_stmt.excluded.question_attempt_timestamp
+            }
+        ))
+        return
+
+    updated = QuestionAttempt.query.filter_by(
+        quiz_attempt_id=quiz_attempt_id, 
+        question_id=question_id
+    ).update({'selected_option': selected_option, 'question_attempt_timestamp': event_time}, synchronize_session=False)
+    if not updated:
+        db.session.add(QuestionAttempt(**values))
+        db.session.flush()
+
+def get_previous_answer(quiz_attempt_id, question_id):
+    """Return the currently saved option of a question, or None if unanswered"""
+    return db.session.query(QuestionAttempt.selected_option).filter_by(
+        quiz_attempt_id=quiz_attempt_id, 
+        question_id=question_id
+    ).scalar()
+
+def stage_save_response(quiz_attempt_id, user_id, question_id, selected_option, event_time, answer_key, counters):
+    """Upsert an answer in the session, add its counter changes and return its SAVE_RESPONSE event (call lock_open_attempt first)"""
+    previous_option = get_previous_answer(quiz_attempt_id, question_id)
+    upsert_question_attempt(quiz_attempt_id, user_id, question_id, selected_option, event_time)
+    counters.update(answer_delta(answer_key, question_id, previous_option, selected_option))
+    return {
+        'user_id': user_id,
+        'quiz_attempt_id': quiz_attempt_id,
+        'question_id': question_id,
+        'event_type': 'SAVE_RESPONSE',
+        'event_timestamp': event_time,
+        'event_details': f"User {user_id} saved response for question {question_id}: {selected_option}",
+        'selected_option': selected_option
+    }
+
+def stage_remove_response(quiz_attempt_id, user_id, question_id, event_time, answer_key, counters, event_type='CLEAR_RESPONSE'):
+    """Delete a saved answer in the session, add its counter changes and return its CLEAR_RESPONSE/DELETE_ANSWER event (call lock_open_attempt first)"""
+    previous_option = get_previous_answer(quiz_attempt_id, question_id)
+    if previous_option is not None:
+        QuestionAttempt.query.filter_by(
+            quiz_attempt_id=quiz_attempt_id, 
+            question_id=question_id
+        ).delete(synchronize_session=False)
+        counters.update(answer_delta(answer_key, question_id, previous_option, None))
+        if event_type == 'DELETE_ANSWER':
+            counters['total_deleted_ans'] += 1
+
+    action = 'cleared response' if event_type == 'CLEAR_RESPONSE' else 'deleted answer'
+    return {
+        'user_id': user_id,
+        'quiz_attempt_id': quiz_attempt_id,
+        'question_id': question_id,
+        'event_type': event_type,
+        'event_timestamp': event_time,
+        'event_details': f"User {user_id} {action} for question {question_id}"
+    }
+
+def navigation_event(quiz_attempt_id, user_id, question_id, event_time):
+    """Build the QUESTION_NUMBER_CLICK event for a navigation"""
+    return {
+        'user_id': user_id,
+        'quiz_attempt_id': quiz_attempt_id,
+        'question_id': question_id,
+        'event_type': 'QUESTION_NUMBER_CLICK',
+        'event_timestamp': event_time,
+        'event_details': f"User {user_id} navigated to question {question_id}"
+    }
+
+def review_event(quiz_attempt_id, user_id, question_id, event_time, marked=True):
+    """Build the MARK_FOR_REVIEW/UNMARK_FOR_REVIEW event for a question"""
+    return {
+        'user_id': user_id,
+        'quiz_attempt_id': quiz_attempt_id,
+        'question_id': question_id,
+        'event_type': 'MARK_FOR_REVIEW' if marked else 'UNMARK_FOR_REVIEW',
+        'event_timestamp': event_time,
+        'event_details': f"User {user_id} {'marked' if marked else 'unmarked'} question {question_id} for review"
+    }
+
+def resolve_event_time(client_timestamp, exam_session, current_ist):
+    """Use the client's ISO timestamp for a batched item, clamped to the attempt window"""
+    if not client_timestamp:
+        return current_ist
+    try:
+        event_time = datetime.fromisoformat(client_timestamp)
+    except (TypeError, ValueError):
+        return current_ist
+    event_time = IST.localize(event_time) if event_time.tzinfo is None else event_time.astimezone(IST)
+    if event_time > current_ist or event_time.timestamp() < exam_session['start_time']:
+        return current_ist
+    return event_time
 
 @user_exam_interface_bp.route('/dashboard/user/quiz/<int:quiz_id>/open_instructions', methods=['POST'])
 @jwt_required()
@@ -24,11 +155,13 @@ def validate_exam_access_token(quiz_attempt_id, access_token):
 def open_instructions(quiz_id):
     """Open quiz instructions and create attempt"""
     try:
-        current_user = get_current_user()
-        quiz = Quiz.query.get_or_404(quiz_id)
+        current_user = get_current_principal()
+        quiz_meta = get_quiz_meta(quiz_id)
+        if quiz_meta is None:
+            return jsonify({'msg': 'Quiz not found'}), 404
         current_ist = get_current_ist()
         
-        if quiz.date_of_quiz > current_ist.date():
+        if date.fromisoformat(quiz_meta['date_of_quiz']) > current_ist.date():
             return jsonify({'msg': 'Quiz not yet available'}), 403
 
         access_token = hashlib.sha256(
@@ -38,31 +171,35 @@ def open_instructions(quiz_id):
         quiz_attempt = QuizAttempt(
             user_id=current_user.id,
             quiz_id=quiz_id,
-            total_questions_count=len(quiz.questions),
-            total_score=sum(q.score_value for q in quiz.questions),
+            total_questions_count=quiz_meta['question_count'],
+            total_score=quiz_meta['max_score'],
+            total_skipped_qn=quiz_meta['question_count'],
             quiz_start_time=current_ist,
+            deadline_time=current_ist + timedelta(minutes=quiz_meta['time_duration']),
+            shuffle_seed=secrets.randbelow(2 ** 31 - 1) + 1,
             access_token=access_token
         )
         
         db.session.add(quiz_attempt)
-        db.session.flush()
+        db.session.commit()
+        create_exam_session(
+            quiz_attempt.id, current_user.id, quiz_id, access_token, current_ist, quiz_meta['time_duration'],
+            shuffle_seed=quiz_attempt.shuffle_seed
+        )
 
-        event_log = QuizEventLog(
+        log_quiz_event(
             user_id=current_user.id,
             quiz_attempt_id=quiz_attempt.id,
             event_type='VIEW_INSTRUCTIONS',
             event_timestamp=current_ist,
             event_details=f"User {current_user.id} opened instructions for quiz {quiz_id}"
         )
-        
-        db.session.add(event_log)
-        db.session.commit()
 
         return jsonify({
             'msg': 'Instructions opened successfully',
             'quiz_id': quiz_id,
             'quiz_attempt_id': quiz_attempt.id,
-            'duration_minutes': quiz.time_duration,
+            'duration_minutes': quiz_meta['time_duration'],
             'access_token': quiz_attempt.access_token,
             'total_questions': quiz_attempt.total_questions_count
         }), 200
@@ -77,41 +214,35 @@ def open_instructions(quiz_id):
 def start_exam(quiz_id, attempt_id):
     """Start exam and log the event"""
     try:
-        current_user = get_current_user()
+        current_user = get_current_principal()
         data = request.get_json() or {}
         access_token = data.get('access_token')
         
         if not access_token:
             return jsonify({'msg': 'Access token is required'}), 400
 
-        quiz_attempt = QuizAttempt.query.get_or_404(attempt_id)
-        
-        if quiz_attempt.user_id != current_user.id or quiz_attempt.quiz_id != quiz_id:
-            return jsonify({'msg': 'Unauthorized access'}), 403
-        
-        if not validate_exam_access_token(attempt_id, access_token):
+        exam_session = validate_exam_access_token(attempt_id, access_token)
+        if not exam_session:
             return jsonify({'msg': 'Invalid or expired access token'}), 403
 
-        if quiz_attempt.quiz_end_time:
-            return jsonify({'msg': 'Exam already completed'}), 400
+        if exam_session['user_id'] != current_user.id or exam_session['quiz_id'] != quiz_id:
+            return jsonify({'msg': 'Unauthorized access'}), 403
 
         current_ist = get_current_ist()
-        event_log = QuizEventLog(
+        log_quiz_event(
             user_id=current_user.id,
             quiz_attempt_id=attempt_id,
             event_type='START_EXAM',
             event_timestamp=current_ist,
             event_details=f"User {current_user.id} started exam for quiz {quiz_id}"
         )
-        
-        db.session.add(event_log)
-        db.session.commit()
+        record_attempt_started(quiz_id, attempt_id)
 
         return jsonify({
             'msg': 'Exam started successfully',
             'quiz_id': quiz_id,
             'attempt_id': attempt_id,
-            'access_token': quiz_attempt.access_token
+            'access_token': exam_session['access_token']
         }), 200
 
     except Exception as e:
@@ -122,62 +253,123 @@ def start_exam(quiz_id, attempt_id):
 @jwt_required()
 @user_required()
 def get_quiz_questions(quiz_id):
-    """Retrieve quiz questions"""
+    """Retrieve quiz questions, in the attempt's own order when ?attempt_id= is given"""
     try:
-        quiz = Quiz.query.get_or_404(quiz_id)
-        questions = [{
-            'id': q.id,
-            'question_statement': q.question_statement,
-            'options': [q.option1, q.option2, q.option3, q.option4],
-            'difficulty': q.difficulty,
-            'score_value': q.score_value
-        } for q in quiz.questions]
-        
-        return jsonify(questions), 200
+        attempt_id = request.args.get('attempt_id', type=int)
+        payload = get_question_paper_bytes(quiz_id)
+        if payload is None:
+            return jsonify({'msg': 'Quiz not found'}), 404
+        if attempt_id is None:
+            return current_app.response_class(payload, status=200, mimetype='application/json')
+
+        current_user = get_current_principal()
+        exam_session = load_exam_session(attempt_id)
+        if not exam_session or exam_session['user_id'] != current_user.id or exam_session['quiz_id'] != quiz_id:
+            return jsonify({'msg': 'Unauthorized access'}), 403
+        if exam_session['shuffle_seed'] is None:
+            return current_app.response_class(payload, status=200, mimetype='application/json')
+
+        return jsonify(personalize_paper(json.loads(payload), exam_session['shuffle_seed'])), 200
     
     except Exception as e:
         return jsonify({'msg': f'Error retrieving questions: {str(e)}'}), 500
 
+@user_exam_interface_bp.route('/dashboard/user/quiz/<int:quiz_id>/attempt/<int:attempt_id>/stream', methods=['GET'])
+@jwt_required(locations=['headers', 'query_string'])
+@user_required(locations=['headers', 'query_string'])
+def stream_exam_events(quiz_id, attempt_id):
+    """Stream remaining time, tab-switch warnings and termination as Server-Sent Events"""
+    try:
+        current_user = get_current_principal()
+        access_token = request.args.get('access_token')
+        
+        exam_session = validate_exam_access_token(attempt_id, access_token) if access_token else None
+        if not exam_session:
+            return jsonify({'msg': 'Valid access token required'}), 403
+        if exam_session['user_id'] != current_user.id or exam_session['quiz_id'] != quiz_id:
+            return jsonify({'msg': 'Unauthorized access'}), 403
+
+        return current_app.response_class(
+            stream_exam_session(exam_session),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+    
+    except Exception as e:
+        return jsonify({'msg': f'Error opening exam stream: {str(e)}'}), 500
+
+@user_exam_interface_bp.route('/dashboard/user/quiz/<int:quiz_id>/attempt/<int:attempt_id>/snapshot', methods=['GET'])
+@jwt_required()
+@user_required()
+def get_attempt_snapshot(quiz_id, attempt_id):
+    """Return the state needed to resume an attempt: answers, review marks, remaining time and warnings"""
+    try:
+        current_user = get_current_principal()
+        access_token = request.args.get('access_token')
+        
+        exam_session = validate_exam_access_token(attempt_id, access_token) if access_token else None
+        if not exam_session:
+            return jsonify({'msg': 'Valid access token required'}), 403
+        if exam_session['user_id'] != current_user.id or exam_session['quiz_id'] != quiz_id:
+            return jsonify({'msg': 'Unauthorized access'}), 403
+
+        attempt_state = get_attempt_state(exam_session)
+        shuffle_seed = exam_session['shuffle_seed']
+        answers = {}
+        for question_id, selected_option in attempt_state['answers'].items():
+            # Report the option slot as the candidate sees it in their shuffled paper
+            if shuffle_seed is not None and selected_option.startswith('option') and selected_option[6:].isdigit():
+                slot = option_permutation(shuffle_seed, question_id).index(int(selected_option[6:]) - 1) + 1
+                selected_option = f"option{slot}"
+            answers[str(question_id)] = selected_option
+
+        return jsonify({
+            'quiz_attempt_id': attempt_id,
+            'answers': answers,
+            'marked_for_review': attempt_state['marked_for_review'],
+            'remaining_seconds': max(int(exam_session['deadline'] - get_current_ist().timestamp()), 0),
+            'warning_count': attempt_state['warning_count'],
+            'max_warnings': MAX_TAB_SWITCH_WARNINGS
+        }), 200
+    
+    except Exception as e:
+        return jsonify({'msg': f'Error loading attempt snapshot: {str(e)}'}), 500
+
 @user_exam_interface_bp.route('/dashboard/user/quiz/<int:quiz_id>/attempt/<int:attempt_id>/question/<int:question_id>', methods=['POST'])
 @jwt_required()
 @user_required()
 def save_question_attempt(quiz_id, attempt_id, question_id):
     """Save user's question attempt"""
     try:
-        current_user = get_current_user()
+        current_user = get_current_principal()
         data = request.get_json() or {}
         selected_option = data.get('selected_option')
         access_token = data.get('access_token')
         
         if not selected_option:
             return jsonify({'msg': 'Selected option is required'}), 400
-        if not access_token or not validate_exam_access_token(attempt_id, access_token):
+        exam_session = validate_exam_access_token(attempt_id, access_token) if access_token else None
+        if not exam_session:
             return jsonify({'msg': 'Valid access token required'}), 403
-
-        quiz_attempt = QuizAttempt.query.get_or_404(attempt_id)
-        if quiz_attempt.user_id != current_user.id or quiz_attempt.quiz_id != quiz_id:
+        if exam_session['user_id'] != current_user.id or exam_session['quiz_id'] != quiz_id:
             return jsonify({'msg': 'Unauthorized access'}), 403
 
-        current_ist = get_current_ist()
-        question_attempt = QuestionAttempt(
-            quiz_attempt_id=attempt_id,
-            user_id=current_user.id,
-            question_id=question_id,
-            selected_option=selected_option,
-            question_attempt_timestamp=current_ist
-        )
-        
-        event_log = QuizEventLog(
-            user_id=current_user.id,
-            quiz_attempt_id=attempt_id,
-            question_id=question_id,
-            event_type='SAVE_RESPONSE',
-            event_timestamp=current_ist,
-            event_details=f"User {current_user.id} saved response for question {question_id}"
-        )
-        
-        db.session.add_all([question_attempt, event_log])
+        # The answer key is read under the attempt lock, so a regrade cannot slip between it and the counter update
+        if not lock_open_attempt(attempt_id):
+            db.session.rollback()
+            return jsonify({'msg': 'Exam already submitted'}), 409
+        answer_key = get_answer_key(quiz_id)
+        if question_id not in answer_key:
+            db.session.rollback()
+            return jsonify({'msg': 'Question not found in this quiz'}), 404
+        selected_option = canonical_option(selected_option, answer_key[question_id][2], exam_session['shuffle_seed'], question_id)
+
+        counters = Counter()
+        event = stage_save_response(attempt_id, current_user.id, question_id, selected_option, get_current_ist(), answer_key, counters)
+        apply_attempt_counters(attempt_id, counters)
         db.session.commit()
+        log_quiz_events([event])
+        record_answer_events(attempt_id, [event])
 
         return jsonify({'msg': 'Response saved successfully'}), 200
     
@@ -185,35 +377,95 @@ def save_question_attempt(quiz_id, attempt_id, question_id):
         db.session.rollback()
         return jsonify({'msg': f'Error saving response: {str(e)}'}), 500
 
+@user_exam_interface_bp.route('/dashboard/user/quiz/<int:quiz_id>/attempt/<int:attempt_id>/sync', methods=['POST'])
+@jwt_required()
+@user_required()
+def sync_exam_batch(quiz_id, attempt_id):
+    """Apply an ordered batch of responses and events in a single transaction"""
+    try:
+        current_user = get_current_principal()
+        data = request.get_json() or {}
+        access_token = data.get('access_token')
+        items = data.get('items')
+        
+        if not isinstance(items, list) or not items:
+            return jsonify({'msg': 'A non-empty list of items is required'}), 400
+        if len(items) > MAX_SYNC_BATCH_SIZE:
+            return jsonify({'msg': f'A batch can hold at most {MAX_SYNC_BATCH_SIZE} items'}), 400
+        exam_session = validate_exam_access_token(attempt_id, access_token) if access_token else None
+        if not exam_session:
+            return jsonify({'msg': 'Valid access token required'}), 403
+        if exam_session['user_id'] != current_user.id or exam_session['quiz_id'] != quiz_id:
+            return jsonify({'msg': 'Unauthorized access'}), 403
+
+        current_ist = get_current_ist()
+        if not lock_open_attempt(attempt_id):
+            db.session.rollback()
+            return jsonify({'msg': 'Exam already submitted'}), 409
+        answer_key = get_answer_key(quiz_id)
+        counters = Counter()
+        review_marks = []
+        events = []
+        for index, item in enumerate(items):
+            item = item if isinstance(item, dict) else {}
+            action = item.get('action')
+            question_id = item.get('question_id')
+            if action not in SYNC_ACTIONS or not isinstance(question_id, int):
+                db.session.rollback()
+                return jsonify({'msg': f'Invalid item at position {index}'}), 400
+
+            event_time = resolve_event_time(item.get('timestamp'), exam_session, current_ist)
+            if action == 'save':
+                selected_option = item.get('selected_option')
+                if not selected_option:
+                    db.session.rollback()
+                    return jsonify({'msg': f'Selected option is required at position {index}'}), 400
+                if question_id not in answer_key:
+                    db.session.rollback()
+                    return jsonify({'msg': f'Question not found in this quiz at position {index}'}), 400
+                selected_option = canonical_option(selected_option, answer_key[question_id][2], exam_session['shuffle_seed'], question_id)
+                events.append(stage_save_response(attempt_id, current_user.id, question_id, selected_option, event_time, answer_key, counters))
+            elif action == 'clear':
+                events.append(stage_remove_response(attempt_id, current_user.id, question_id, event_time, answer_key, counters, 'CLEAR_RESPONSE'))
+            elif action == 'delete':
+                events.append(stage_remove_response(attempt_id, current_user.id, question_id, event_time, answer_key, counters, 'DELETE_ANSWER'))
+            elif action == 'navigate':
+                events.append(navigation_event(attempt_id, current_user.id, question_id, event_time))
+            else:
+                marked = bool(item.get('marked', True))
+                review_marks.append((question_id, marked))
+                events.append(review_event(attempt_id, current_user.id, question_id, event_time, marked))
+
+        if review_marks:
+            counters['total_marked_for_review_qn'] += set_review_marks(attempt_id, review_marks)
+        apply_attempt_counters(attempt_id, counters)
+        db.session.commit()
+        log_quiz_events(events)
+        record_answer_events(attempt_id, events)
+
+        return jsonify({'msg': 'Batch synced successfully', 'applied': len(events)}), 200
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'msg': f'Error syncing batch: {str(e)}'}), 500
+
 @user_exam_interface_bp.route('/dashboard/user/quiz/<int:quiz_id>/attempt/<int:attempt_id>/navigate/<int:question_id>', methods=['POST'])
 @jwt_required()
 @user_required()
 def navigate_question(quiz_id, attempt_id, question_id):
     """Log question navigation"""
     try:
-        current_user = get_current_user()
+        current_user = get_current_principal()
         data = request.get_json() or {}
         access_token = data.get('access_token')
         
-        if not access_token or not validate_exam_access_token(attempt_id, access_token):
+        exam_session = validate_exam_access_token(attempt_id, access_token) if access_token else None
+        if not exam_session:
             return jsonify({'msg': 'Valid access token required'}), 403
-
-        quiz_attempt = QuizAttempt.query.get_or_404(attempt_id)
-        if quiz_attempt.user_id != current_user.id or quiz_attempt.quiz_id != quiz_id:
+        if exam_session['user_id'] != current_user.id or exam_session['quiz_id'] != quiz_id:
             return jsonify({'msg': 'Unauthorized access'}), 403
 
-        current_ist = get_current_ist()
-        event_log = QuizEventLog(
-            user_id=current_user.id,
-            quiz_attempt_id=attempt_id,
-            question_id=question_id,
-            event_type='QUESTION_NUMBER_CLICK',
-            event_timestamp=current_ist,
-            event_details=f"User {current_user.id} navigated to question {question_id}"
-        )
-        
-        db.session.add(event_log)
-        db.session.commit()
+        log_quiz_events([navigation_event(attempt_id, current_user.id, question_id, get_current_ist())])
 
         return jsonify({'msg': 'Navigation logged successfully'}), 200
     
@@ -227,65 +479,32 @@ def navigate_question(quiz_id, attempt_id, question_id):
 def submit_exam(quiz_id, attempt_id):
     """Submit the exam and calculate results"""
     try:
-        current_user = get_current_user()
+        current_user = get_current_principal()
         data = request.get_json() or {}
         access_token = data.get('access_token')
         
-        if not access_token or not validate_exam_access_token(attempt_id, access_token):
+        exam_session = validate_exam_access_token(attempt_id, access_token) if access_token else None
+        if not exam_session:
             return jsonify({'msg': 'Valid access token required'}), 403
-
-        quiz_attempt = QuizAttempt.query.get_or_404(attempt_id)
-        if quiz_attempt.user_id != current_user.id or quiz_attempt.quiz_id != quiz_id:
+        if exam_session['user_id'] != current_user.id or exam_session['quiz_id'] != quiz_id:
             return jsonify({'msg': 'Unauthorized access'}), 403
-        if quiz_attempt.quiz_end_time:
-            return jsonify({'msg': 'Exam already submitted'}), 400
 
         current_ist = get_current_ist()
-        question_attempts = QuestionAttempt.query.filter_by(quiz_attempt_id=attempt_id).all()
-        
-        quiz_attempt.quiz_end_time = current_ist
-        current_ist = get_current_ist()
-        current_ist_naive = current_ist.replace(tzinfo=None)
-        quiz_attempt.total_time_taken = int(
-            (current_ist_naive - quiz_attempt.quiz_start_time).total_seconds()
-        )
-        # quiz_attempt.total_time_taken = int(
-        #     (current_ist - quiz_attempt.quiz_start_time).total_seconds()
-        # )
-        quiz_attempt.total_attempted_qn = len(question_attempts)
-        quiz_attempt.total_correct_ans = sum(
-            1 for qa in question_attempts 
-            if Question.query.get(qa.question_id).correct_option == qa.selected_option
-        )
-        quiz_attempt.total_wrong_ans = quiz_attempt.total_attempted_qn - quiz_attempt.total_correct_ans
-        quiz_attempt.total_score_earned = sum(
-            Question.query.get(qa.question_id).score_value 
-            if Question.query.get(qa.question_id).correct_option == qa.selected_option 
-            else 0
-            for qa in question_attempts
-        )
-        quiz_attempt.total_marked_for_review_qn = QuizEventLog.query.filter_by(
-            quiz_attempt_id=attempt_id, 
-            event_type='MARK_FOR_REVIEW'
-        ).count()
-
-
-        event_log = QuizEventLog(
+        score_details, finalized = finalize_quiz_attempt(attempt_id, exam_session['start_time'], current_ist)
+        if score_details is None:
+            return jsonify({'msg': 'Quiz attempt not found'}), 404
+        if not finalized:
+            return jsonify(dict(score_details, msg='Exam already submitted')), 200
+        end_exam_session(attempt_id, 'Manual submission')
+        record_attempts_finished([(quiz_id, attempt_id)])
+
+        log_quiz_event(
             user_id=current_user.id,
             quiz_attempt_id=attempt_id,
             event_type='END_EXAMINATION',
             event_timestamp=current_ist,
             event_details=f"User {current_user.id} manually submitted quiz {quiz_id}"
         )
-        
-        db.session.add(event_log)
-        db.session.commit()
-        score_details = {
-                    'total_score_earned': quiz_attempt.total_score_earned,
-                    'total_correct_ans': quiz_attempt.total_correct_ans,
-                    'total_time_taken': quiz_attempt.total_time_taken,
-                    'total_questions': quiz_attempt.total_questions_count
-                }
                 
         # Send email notification
         from celery_tasks import send_exam_status_email
@@ -297,13 +516,7 @@ def submit_exam(quiz_id, attempt_id):
             score_details=score_details
         )
 
-        return jsonify({
-            'msg': 'Exam submitted successfully',
-            'total_score_earned': quiz_attempt.total_score_earned,
-            'total_correct_ans': quiz_attempt.total_correct_ans,
-            'total_time_taken': quiz_attempt.total_time_taken,
-            'total_questions': quiz_attempt.total_questions_count
-        }), 200
+        return jsonify(dict(score_details, msg='Exam submitted successfully')), 200
     
     except Exception as e:
         db.session.rollback()
@@ -315,65 +528,33 @@ def submit_exam(quiz_id, attempt_id):
 def end_exam(quiz_id, attempt_id):
     """End the exam automatically"""
     try:
-        current_user = get_current_user()
+        current_user = get_current_principal()
         data = request.get_json() or {}
         access_token = data.get('access_token')
         reason = data.get('reason', 'Unknown')
         
-        if not access_token or not validate_exam_access_token(attempt_id, access_token):
+        exam_session = validate_exam_access_token(attempt_id, access_token) if access_token else None
+        if not exam_session:
             return jsonify({'msg': 'Valid access token required'}), 403
-
-        quiz_attempt = QuizAttempt.query.get_or_404(attempt_id)
-        if quiz_attempt.user_id != current_user.id or quiz_attempt.quiz_id != quiz_id:
+        if exam_session['user_id'] != current_user.id or exam_session['quiz_id'] != quiz_id:
             return jsonify({'msg': 'Unauthorized access'}), 403
-        if quiz_attempt.quiz_end_time:
-            return jsonify({'msg': 'Exam already ended'}), 400
 
         current_ist = get_current_ist()
-        question_attempts = QuestionAttempt.query.filter_by(quiz_attempt_id=attempt_id).all()
-        
-        quiz_attempt.quiz_end_time = current_ist
-        current_ist = get_current_ist()
-        current_ist_naive = current_ist.replace(tzinfo=None)
-        quiz_attempt.total_time_taken = int(
-            (current_ist_naive - quiz_attempt.quiz_start_time).total_seconds()
-        )
-        # quiz_attempt.total_time_taken = int(
-        #     (current_ist - quiz_attempt.quiz_start_time).total_seconds()
-        # )
-        quiz_attempt.total_attempted_qn = len(question_attempts)
-        quiz_attempt.total_correct_ans = sum(
-            1 for qa in question_attempts 
-            if Question.query.get(qa.question_id).correct_option == qa.selected_option
-        )
-        quiz_attempt.total_wrong_ans = quiz_attempt.total_attempted_qn - quiz_attempt.total_correct_ans
-        quiz_attempt.total_score_earned = sum(
-            Question.query.get(qa.question_id).score_value 
-            if Question.query.get(qa.question_id).correct_option == qa.selected_option 
-            else 0
-            for qa in question_attempts
-        )
-        quiz_attempt.total_marked_for_review_qn = QuizEventLog.query.filter_by(
-            quiz_attempt_id=attempt_id, 
-            event_type='MARK_FOR_REVIEW'
-        ).count()
-
-        event_log = QuizEventLog(
+        score_details, finalized = finalize_quiz_attempt(attempt_id, exam_session['start_time'], current_ist)
+        if score_details is None:
+            return jsonify({'msg': 'Quiz attempt not found'}), 404
+        if not finalized:
+            return jsonify(dict(score_details, msg='Exam already ended')), 200
+        end_exam_session(attempt_id, reason)
+        record_attempts_finished([(quiz_id, attempt_id)])
+
+        log_quiz_event(
             user_id=current_user.id,
             quiz_attempt_id=attempt_id,
             event_type='END_EXAMINATION',
             event_timestamp=current_ist,
             event_details=f"User {current_user.id} exam ended for quiz {quiz_id}. Reason: {reason}"
         )
-        
-        db.session.add(event_log)
-        db.session.commit()
-        score_details = {
-                    'total_score_earned': quiz_attempt.total_score_earned,
-                    'total_correct_ans': quiz_attempt.total_correct_ans,
-                    'total_time_taken': quiz_attempt.total_time_taken,
-                    'total_questions': quiz_attempt.total_questions_count
-                }
                 
         # Send email notification
         from celery_tasks import send_exam_status_email
@@ -385,13 +566,7 @@ def end_exam(quiz_id, attempt_id):
             score_details=score_details
         )
         
-        return jsonify({
-            'msg': f'Exam ended due to {reason}',
-            'total_score_earned': quiz_attempt.total_score_earned,
-            'total_correct_ans': quiz_attempt.total_correct_ans,
-            'total_time_taken': quiz_attempt.total_time_taken,
-            'total_questions': quiz_attempt.total_questions_count
-        }), 200
+        return jsonify(dict(score_details, msg=f'Exam ended due to {reason}')), 200
     
     except Exception as e:
         db.session.rollback()
@@ -403,70 +578,40 @@ def end_exam(quiz_id, attempt_id):
 def log_tab_switch(quiz_id, attempt_id):
     """Log tab switch warning"""
     try:
-        current_user = get_current_user()
+        current_user = get_current_principal()
         data = request.get_json() or {}
         access_token = data.get('access_token')
         
-        if not access_token or not validate_exam_access_token(attempt_id, access_token):
+        exam_session = validate_exam_access_token(attempt_id, access_token) if access_token else None
+        if not exam_session:
             return jsonify({'msg': 'Valid access token required'}), 403
-
-        quiz_attempt = QuizAttempt.query.get_or_404(attempt_id)
-        if quiz_attempt.user_id != current_user.id or quiz_attempt.quiz_id != quiz_id:
+        if exam_session['user_id'] != current_user.id or exam_session['quiz_id'] != quiz_id:
             return jsonify({'msg': 'Unauthorized access'}), 403
 
         current_ist = get_current_ist()
-        event_log = QuizEventLog(
+        warning_count = incr_tab_switch_count(exam_session)
+        log_quiz_event(
             user_id=current_user.id,
             quiz_attempt_id=attempt_id,
             event_type='TAB_SWITCH_WARNING',
             event_timestamp=current_ist,
             event_details=f"User {current_user.id} switched tabs during quiz {quiz_id}"
         )
-        
-        db.session.add(event_log)
-        db.session.flush()
-
-        warning_count = QuizEventLog.query.filter_by(
-            quiz_attempt_id=attempt_id, 
-            event_type='TAB_SWITCH_WARNING'
-        ).count()
-
-        if warning_count > 3:
-            question_attempts = QuestionAttempt.query.filter_by(quiz_attempt_id=attempt_id).all()
-            quiz_attempt.quiz_end_time = current_ist
-            
-            current_ist = get_current_ist()
-            current_ist_naive = current_ist.replace(tzinfo=None)
-            quiz_attempt.total_time_taken = int(
-                (current_ist_naive - quiz_attempt.quiz_start_time).total_seconds()
-            )
-            quiz_attempt.total_attempted_qn = len(question_attempts)
-            quiz_attempt.total_correct_ans = sum(
-                1 for qa in question_attempts 
-                if Question.query.get(qa.question_id).correct_option == qa.selected_option
-            )
-            quiz_attempt.total_wrong_ans = quiz_attempt.total_attempted_qn - quiz_attempt.total_correct_ans
-            quiz_attempt.total_score_earned = sum(
-                Question.query.get(qa.question_id).score_value 
-                if Question.query.get(qa.question_id).correct_option == qa.selected_option 
-                else 0
-                for qa in question_attempts
-            )
-            end_event_log = QuizEventLog(
+        record_tab_warning(quiz_id)
+
+        if warning_count > MAX_TAB_SWITCH_WARNINGS:
+            score_details, finalized = finalize_quiz_attempt(attempt_id, exam_session['start_time'], current_ist)
+            if not finalized:
+                return jsonify({'msg': 'Exam ended due to multiple tab switches'}), 403
+            end_exam_session(attempt_id, 'Tab switch limit exceeded')
+            record_attempts_finished([(quiz_id, attempt_id)])
+            log_quiz_event(
                 user_id=current_user.id,
                 quiz_attempt_id=attempt_id,
                 event_type='END_EXAMINATION',
                 event_timestamp=current_ist,
                 event_details=f"User {current_user.id} exam ended due to multiple tab switches"
             )
-            db.session.add(end_event_log)
-            db.session.commit()
-            score_details = {
-                        'total_score_earned': quiz_attempt.total_score_earned,
-                        'total_correct_ans': quiz_attempt.total_correct_ans,
-                        'total_time_taken': quiz_attempt.total_time_taken,
-                        'total_questions': quiz_attempt.total_questions_count
-                    }
                     
             # Send email notification
             from celery_tasks import send_exam_status_email
@@ -479,8 +624,10 @@ def log_tab_switch(quiz_id, attempt_id):
             )
             return jsonify({'msg': 'Exam ended due to multiple tab switches'}), 403
 
-
-        db.session.commit()
+        publish_exam_event(attempt_id, 'warning', {
+            'warning_count': warning_count,
+            'max_warnings': MAX_TAB_SWITCH_WARNINGS
+        })
         return jsonify({'msg': 'Tab switch warning logged', 'warning_count': warning_count}), 200
     
     except Exception as e:
@@ -493,30 +640,25 @@ def log_tab_switch(quiz_id, attempt_id):
 def mark_for_review(quiz_id, attempt_id, question_id):
     """Mark question for review"""
     try:
-        current_user = get_current_user()
+        current_user = get_current_principal()
         data = request.get_json() or {}
         access_token = data.get('access_token')
         
-        if not access_token or not validate_exam_access_token(attempt_id, access_token):
+        exam_session = validate_exam_access_token(attempt_id, access_token) if access_token else None
+        if not exam_session:
             return jsonify({'msg': 'Valid access token required'}), 403
-
-        quiz_attempt = QuizAttempt.query.get_or_404(attempt_id)
-        if quiz_attempt.user_id != current_user.id or quiz_attempt.quiz_id != quiz_id:
+        if exam_session['user_id'] != current_user.id or exam_session['quiz_id'] != quiz_id:
             return jsonify({'msg': 'Unauthorized access'}), 403
 
-        current_ist = get_current_ist()
-        event_log = QuizEventLog(
-            user_id=current_user.id,
-            quiz_attempt_id=attempt_id,
-            question_id=question_id,
-            event_type='MARK_FOR_REVIEW',
-            event_timestamp=current_ist,
-            event_details=f"User {current_user.id} marked question {question_id} for review"
-        )
-        
-        db.session.add(event_log)
-        db.session.commit()
+        marked = bool(data.get('marked', True))
+        marked_change = set_review_marks(attempt_id, [(question_id, marked)])
+        if marked_change:
+            apply_attempt_counters(attempt_id, {'total_marked_for_review_qn': marked_change})
+            db.session.commit()
+        log_quiz_events([review_event(attempt_id, current_user.id, question_id, get_current_ist(), marked)])
 
+        if not marked:
+            return jsonify({'msg': 'Question unmarked for review successfully'}), 200
         return jsonify({'msg': 'Question marked for review successfully'}), 200
     
     except Exception as e:
@@ -529,38 +671,25 @@ def mark_for_review(quiz_id, attempt_id, question_id):
 def clear_response(quiz_id, attempt_id, question_id):
     """Clear question response"""
     try:
-        current_user = get_current_user()
+        current_user = get_current_principal()
         data = request.get_json() or {}
         access_token = data.get('access_token')
         
-        if not access_token or not validate_exam_access_token(attempt_id, access_token):
+        exam_session = validate_exam_access_token(attempt_id, access_token) if access_token else None
+        if not exam_session:
             return jsonify({'msg': 'Valid access token required'}), 403
-
-        quiz_attempt = QuizAttempt.query.get_or_404(attempt_id)
-        if quiz_attempt.user_id != current_user.id or quiz_attempt.quiz_id != quiz_id:
+        if exam_session['user_id'] != current_user.id or exam_session['quiz_id'] != quiz_id:
             return jsonify({'msg': 'Unauthorized access'}), 403
 
-        question_attempt = QuestionAttempt.query.filter_by(
-            quiz_attempt_id=attempt_id, 
-            question_id=question_id
-        ).first()
-        
-        if question_attempt:
-            db.session.delete(question_attempt)
-            db.session.flush()
-
-        current_ist = get_current_ist()
-        event_log = QuizEventLog(
-            user_id=current_user.id,
-            quiz_attempt_id=attempt_id,
-            question_id=question_id,
-            event_type='CLEAR_RESPONSE',
-            event_timestamp=current_ist,
-            event_details=f"User {current_user.id} cleared response for question {question_id}"
-        )
-        
-        db.session.add(event_log)
+        if not lock_open_attempt(attempt_id):
+            db.session.rollback()
+            return jsonify({'msg': 'Exam already submitted'}), 409
+        counters = Counter()
+        event = stage_remove_response(attempt_id, current_user.id, question_id, get_current_ist(), get_answer_key(quiz_id), counters, 'CLEAR_RESPONSE')
+        apply_attempt_counters(attempt_id, counters)
         db.session.commit()
+        log_quiz_events([event])
+        record_answer_events(attempt_id, [event])
 
         return jsonify({'msg': 'Response cleared successfully'}), 200
     
@@ -574,38 +703,25 @@ def clear_response(quiz_id, attempt_id, question_id):
 def delete_answer(quiz_id, attempt_id, question_id):
     """Delete question answer"""
     try:
-        current_user = get_current_user()
+        current_user = get_current_principal()
         data = request.get_json() or {}
         access_token = data.get('access_token')
         
-        if not access_token or not validate_exam_access_token(attempt_id, access_token):
+        exam_session = validate_exam_access_token(attempt_id, access_token) if access_token else None
+        if not exam_session:
             return jsonify({'msg': 'Valid access token required'}), 403
-
-        quiz_attempt = QuizAttempt.query.get_or_404(attempt_id)
-        if quiz_attempt.user_id != current_user.id or quiz_attempt.quiz_id != quiz_id:
+        if exam_session['user_id'] != current_user.id or exam_session['quiz_id'] != quiz_id:
             return jsonify({'msg': 'Unauthorized access'}), 403
 
-        question_attempt = QuestionAttempt.query.filter_by(
-            quiz_attempt_id=attempt_id, 
-            question_id=question_id
-        ).first()
-        
-        if question_attempt:
-            db.session.delete(question_attempt)
-            db.session.flush()
-
-        current_ist = get_current_ist()
-        event_log = QuizEventLog(
-            user_id=current_user.id,
-            quiz_attempt_id=attempt_id,
-            question_id=question_id,
-            event_type='DELETE_ANSWER',
-            event_timestamp=current_ist,
-            event_details=f"User {current_user.id} deleted answer for question {question_id}"
-        )
-        
-        db.session.add(event_log)
+        if not lock_open_attempt(attempt_id):
+            db.session.rollback()
+            return jsonify({'msg': 'Exam already submitted'}), 409
+        counters = Counter()
+        event = stage_remove_response(attempt_id, current_user.id, question_id, get_current_ist(), get_answer_key(quiz_id), counters, 'DELETE_ANSWER')
+        apply_attempt_counters(attempt_id, counters)
         db.session.commit()
+        log_quiz_events([event])
+        record_answer_events(attempt_id, [event])
 
         return jsonify({'msg': 'Answer deleted successfully'}), 200
     
@@ -3,7 +3,7 @@ from flask_jwt_extended import jwt_required
 import stripe
 import os
 from model import db,User, Quiz, Question, QuizAttempt, QuestionAttempt, QuizEventLog, QuizPayment, QuizCart, Chapter, Subject
-from api_utils import user_required, get_current_user, get_current_ist
+from api_utils import user_required, get_current_principal, get_current_ist
 from dotenv import load_dotenv
 from sqlalchemy import func
 from flask import send_file
@@ -22,7 +22,7 @@ stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
 @jwt_required()
 @user_required()
 def initiate_checkout():
-    current_user = get_current_user()
+    current_user = get_current_principal()
     cart_items = QuizCart.query.filter_by(user_id=current_user.id).all()
     if not cart_items:
         return jsonify({'msg': 'Cart is empty'}), 400
@@ -84,7 +84,7 @@ def initiate_checkout():
 @jwt_required()
 @user_required()
 def verify_payment(session_id):
-    current_user = get_current_user()
+    current_user = get_current_principal()
     
     try:
         session = stripe.checkout.Session.retrieve(session_id)
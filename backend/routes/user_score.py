@@ -2,7 +2,7 @@ from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime, timedelta
 from model import db, User, Quiz, QuizAttempt, Chapter, Subject
-from api_utils import user_required, get_current_user
+from api_utils import user_required, get_current_principal
 
 user_score_bp = Blueprint('user_score', __name__)
 
@@ -12,7 +12,7 @@ user_score_bp = Blueprint('user_score', __name__)
 @user_required()
 def get_user_scores():
     try:
-        current_user = get_current_user()
+        current_user = get_current_principal()
         current_month = datetime.now().month
         previous_month = (datetime.now().replace(day=1) - timedelta(days=1)).month
 
@@ -112,7 +112,7 @@ def get_user_scores():
 @user_required()
 def get_quiz_attempts(quiz_id):
     try:
-        current_user = get_current_user()
+        current_user = get_current_principal()
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 10, type=int)
         exclude_latest = request.args.get('exclude_latest', 'false').lower() == 'true'
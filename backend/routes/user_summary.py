@@ -2,7 +2,7 @@ from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from sqlalchemy import func, extract
 from model import db, User, Quiz, QuizAttempt, QuestionAttempt, Subject, Chapter,Question
-from api_utils import user_required, get_current_ist, get_current_user
+from api_utils import user_required, get_current_ist, get_current_principal
 from datetime import datetime, timedelta
 
 user_summary_bp = Blueprint('user_summary', __name__)
@@ -13,7 +13,7 @@ user_summary_bp = Blueprint('user_summary', __name__)
 @user_required()
 def get_user_scores():
     try:
-        current_user = get_current_user()
+        current_user = get_current_principal()
         current_month = datetime.now().month
         previous_month = (datetime.now().replace(day=1) - timedelta(days=1)).month
 
@@ -113,7 +113,7 @@ def get_user_scores():
 @user_required()
 def trigger_quiz_attempts_export():
     try:
-        current_user = get_current_user()
+        current_user = get_current_principal()
         current_user_id = current_user.id
         current_user = User.query.filter_by(id=current_user_id).first()
         if not current_user:
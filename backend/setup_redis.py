@@ -0,0 +1,27 @@
+# setup_redis.py
+import redis
+
+
+class RedisStore:
+    """Raw Redis client for counters, buffers and pre-encoded payloads that Flask-Caching cannot express."""
+
+    def __init__(self):
+        self.client = None
+
+    def init_app(self, app):
+        redis_url = app.config.get("CACHE_REDIS_URL")
+        if redis_url:
+            self.client = redis.Redis.from_url(redis_url)
+        else:
+            self.client = redis.Redis(
+                host=app.config["CACHE_REDIS_HOST"],
+                port=app.config.get("CACHE_REDIS_PORT", 6379),
+                db=app.config.get("CACHE_REDIS_DB", 3)
+            )
+        app.extensions["redis_store"] = self
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+
+redis_store = RedisStore()
@@ -0,0 +1,47 @@
+# /shuffle_utils.py
+import random
+import re
+
+OPTION_SLOT = re.compile(r'^option([1-9][0-9]*)$')
+
+
+def question_permutation(shuffle_seed, question_count):
+    """Return the paper positions in the order an attempt sees them."""
+    order = list(range(question_count))
+    random.Random(shuffle_seed).shuffle(order)
+    return order
+
+
+def option_permutation(shuffle_seed, question_id, option_count=4):
+    """Return the canonical option indexes in the order an attempt sees them for one question."""
+    order = list(range(option_count))
+    random.Random(shuffle_seed * 1000003 + question_id).shuffle(order)
+    return order
+
+
+def personalize_paper(questions, shuffle_seed):
+    """Reorder a shared question paper (and each question's options) for one attempt without copying the cache."""
+    return [
+        dict(question, options=[
+            question['options'][index]
+            for index in option_permutation(shuffle_seed, question['id'], len(question['options']))
+        ])
+        for question in (questions[position] for position in question_permutation(shuffle_seed, len(questions)))
+    ]
+
+
+def canonical_option(selected_option, options, shuffle_seed, question_id):
+    """Map an answer to the stored 'optionN' form.
+
+    Accepts the option text or the 'optionN' slot the candidate saw, un-permuting the slot when the attempt is shuffled.
+    Anything unrecognised is returned unchanged and grades as wrong.
+    """
+    slot = OPTION_SLOT.match(selected_option)
+    if slot and int(slot.group(1)) <= len(options):
+        index = int(slot.group(1)) - 1
+        if shuffle_seed is not None:
+            index = option_permutation(shuffle_seed, question_id, len(options))[index]
+        return f"option{index + 1}"
+    if selected_option in options:
+        return f"option{options.index(selected_option) + 1}"
+    return selected_option
@@ -0,0 +1,115 @@
+# /token_revocation_utils.py
+import hashlib
+import math
+import threading
+import time
+from flask import current_app
+from flask_jwt_extended import get_jwt
+from setup_redis import redis_store
+
+REVOKED_TOKENS_KEY = "revoked_tokens"  # sorted set: jti -> expiry (unix seconds)
+REVOKED_TOKENS_VERSION_KEY = "revoked_tokens:version"
+REVOCATION_REFRESH_INTERVAL = 5  # seconds a process may lag behind revocations made elsewhere
+BLOOM_FALSE_POSITIVE_RATE = 0.001
+BLOOM_MIN_CAPACITY = 1024
+_NOT_LOADED = object()
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings: no false negatives, rare false positives."""
+
+    def __init__(self, capacity, false_positive_rate=BLOOM_FALSE_POSITIVE_RATE):
+        capacity = max(capacity, 1)
+        self.size = max(int(-capacity * math.log(false_positive_rate) / math.log(2) ** 2), 8)
+        self.hash_count = max(int(round(self.size / capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:], 'big') | 1
+        return ((first + i * second) % self.size for i in range(self.hash_count))
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class _RevocationSnapshot:
+    """This process's view of the revoked JTIs, rebuilt from Redis when the revocation version moves."""
+
+    def __init__(self):
+        self.bloom = BloomFilter(BLOOM_MIN_CAPACITY)
+        self.version = _NOT_LOADED
+        self.next_refresh = 0.0
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        """Reload the filter at most once per interval, and only if something was revoked meanwhile."""
+        now = time.monotonic()
+        if now < self.next_refresh or not self.lock.acquire(blocking=False):
+            return
+        try:
+            self.next_refresh = now + REVOCATION_REFRESH_INTERVAL
+            version = redis_store.get(REVOKED_TOKENS_VERSION_KEY)
+            if version == self.version:
+                return
+            pipe = redis_store.pipeline()
+            pipe.zremrangebyscore(REVOKED_TOKENS_KEY, '-inf', time.time())
+            pipe.zrange(REVOKED_TOKENS_KEY, 0, -1)
+            _, jtis = pipe.execute()
+            bloom = BloomFilter(max(len(jtis) * 2, BLOOM_MIN_CAPACITY))
+            for jti in jtis:
+                bloom.add(jti.decode())
+            self.bloom, self.version = bloom, version
+        except Exception as e:
+            # Keep serving from the last snapshot; retry at the next interval
+            print(f"Error refreshing revoked token filter: {e}")
+        finally:
+            self.lock.release()
+
+
+_snapshot = _RevocationSnapshot()
+
+
+def revoke_token(jti, expires_at):
+    """Revoke a token until its own expiry (unix seconds); other processes pick it up within the refresh interval."""
+    pipe = redis_store.pipeline()
+    pipe.zadd(REVOKED_TOKENS_KEY, {jti: expires_at})
+    pipe.incr(REVOKED_TOKENS_VERSION_KEY)
+    pipe.execute()
+    _snapshot.bloom.add(jti)
+
+
+def revoke_session_tokens():
+    """Revoke the current request's access token and the refresh token of its login session.
+
+    The session's refresh token is named by the access token's refresh_jti claim; its exact expiry is
+    unknown here, so it stays revoked for a full refresh token lifetime.
+    """
+    claims = get_jwt()
+    revoke_token(claims["jti"], claims["exp"])
+    if claims.get("refresh_jti"):
+        revoke_token(claims["refresh_jti"], int(time.time()) + current_app.config["JWT_REFRESH_TOKEN_EXPIRES"])
+
+
+def is_token_revoked(jwt_payload):
+    """Return True if a decoded token was revoked.
+
+    A token the local Bloom filter has never seen costs no network I/O; only filter hits
+    (real revocations or rare false positives) are confirmed against Redis.
+    """
+    jti = jwt_payload.get('jti')
+    if not jti:
+        return False
+    _snapshot.refresh()
+    if jti not in _snapshot.bloom:
+        return False
+    try:
+        return redis_store.zscore(REVOKED_TOKENS_KEY, jti) is not None
+    except Exception as e:
+        print(f"Error checking revoked token: {e}")
+        return True